@@ -1,4 +1,5 @@
 import os
+import io
 import asyncio
 import sqlite3
 import time
@@ -6,18 +7,43 @@ import json
 import socket
 import platform
 import tempfile
-import zipfile
 import uuid
 import subprocess
 import shutil
-from datetime import datetime
+import fnmatch
+import queue
+import tarfile
+import itertools
+import select
+import sys
+import logging
+import traceback
+from collections import Counter
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import gzip
+import zlib
+import struct
+from collections import deque
+import hashlib
+import hmac
+import base64
+import re
+from array import array
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
 from typing import Any
 
 import bcrypt
 import psutil
 import docker
-from docker.errors import DockerException, NotFound
+from docker.errors import APIError, DockerException, NotFound
+from requests.exceptions import ConnectionError as RequestsConnectionError, RequestException, Timeout
+
+try:
+    import zstandard
+except ImportError:  # tar.zst — только если пакет установлен
+    zstandard = None
 
 from fastapi import FastAPI, Request, UploadFile, File, Form, Body, Query
 from fastapi.responses import (
@@ -27,10 +53,12 @@ from fastapi.responses import (
     FileResponse,
     PlainTextResponse,
     Response,
+    StreamingResponse,
 )
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from starlette.middleware.sessions import SessionMiddleware
+from starlette.routing import Match
 
 
 VERSION = "0.6.0"
@@ -40,6 +68,8 @@ DATADIR = APPDIR / "data"
 DBPATH = DATADIR / "app.db"
 APPSDIR = DATADIR / "apps"
 ICONSDIR = DATADIR / "icons"
+LOGSDIR = DATADIR / "logs"
+BACKUPSDIR = DATADIR / "backups"
 
 SESSIONSECRET = os.environ.get("SERVER_UI_SECRET", "dev-secret-change-me")
 
@@ -50,6 +80,8 @@ AVAILABLETILES = {
     "temp": "Температура",
     "uptime": "Аптайм",
     "net": "Сеть",
+    "diskio": "Диск I/O",
+    "containers": "Контейнеры",
 }
 
 DEFAULT_WIDGETS = ["cpu", "ram", "disk", "temp", "uptime", "net"]
@@ -68,6 +100,8 @@ APPCATALOG: dict[str, Any] = {
         "description": "Торрент-клиент с веб-интерфейсом",
         "default_url": "http://localhost:8080",
         "tags": ["P2P"],
+        # Загрузки не бэкапим по умолчанию: сотни ГБ, восстанавливаются заново
+        "backup_exclude": ["downloads"],
         "services": [
             {
                 "name": "qbittorrent",
@@ -129,13 +163,103 @@ templates = Jinja2Templates(directory=str(APPDIR / "templates"))
 
 
 # ---------------- DB ----------------
-def db() -> sqlite3.Connection:
+# Одно соединение на поток: без открытия файла и mkdir на каждый запрос.
+# `with db() as conn:` по-прежнему даёт транзакцию (commit/rollback), соединение не закрывается.
+DBCACHEDSTATEMENTS = 256
+_DBLOCAL = threading.local()
+
+
+def _dbconnect() -> sqlite3.Connection:
     DATADIR.mkdir(parents=True, exist_ok=True)
-    conn = sqlite3.connect(DBPATH)
+    conn = sqlite3.connect(DBPATH, timeout=15, cached_statements=DBCACHEDSTATEMENTS)
     conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def db() -> sqlite3.Connection:
+    path = str(DBPATH)
+    conn = getattr(_DBLOCAL, "conn", None)
+    if conn is None or _DBLOCAL.path != path:
+        conn = _dbconnect()
+        _DBLOCAL.conn = conn
+        _DBLOCAL.path = path
     return conn
 
 
+# ---------------- Config cache ----------------
+# users/settings/widgetsconfig/apppull — одиночные строки, меняются только из UI. Держим их в памяти (write-through).
+# Каждая запись конфигурации увеличивает counters('config') в своей транзакции; раз в секунду сверяем
+# этот номер — так видны изменения из других воркеров, а записи задач, pull'ов и т.п. кэш не трогают.
+CACHECHECKINTERVAL = 1.0
+_CACHE: dict[str, Any] = {}
+_CACHELOCK = threading.Lock()
+_CACHESTATE: dict[str, Any] = {"path": None, "version": None, "checked": 0.0, "gen": 0}
+
+
+def _cacheversion() -> int | None:
+    try:
+        row = db().execute("SELECT value FROM counters WHERE name='config'").fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return row[0] if row else None
+
+
+def _cacheclear(version: int | None) -> None:
+    _CACHESTATE["version"] = version
+    _CACHESTATE["gen"] += 1
+    _CACHE.clear()
+
+
+def _cache_validate() -> None:
+    now = time.monotonic()
+    if now - _CACHESTATE["checked"] < CACHECHECKINTERVAL and _CACHESTATE["path"] == str(DBPATH):
+        return
+    _CACHESTATE["checked"] = now
+    _CACHESTATE["path"] = str(DBPATH)
+    version = _cacheversion()
+    if version is None or version != _CACHESTATE["version"]:
+        _cacheclear(version)
+
+
+def configbump(conn: sqlite3.Connection) -> int:
+    """Вызывать в транзакции, которая меняет конфигурацию; номер передать в cacheset."""
+    conn.execute("UPDATE counters SET value=value+1 WHERE name='config'")
+    return conn.execute("SELECT value FROM counters WHERE name='config'").fetchone()[0]
+
+
+def cacheget(key: str, loader):
+    with _CACHELOCK:
+        _cache_validate()
+        if key in _CACHE:
+            return _CACHE[key]
+        gen = _CACHESTATE["gen"]
+    value = loader()
+    with _CACHELOCK:
+        # Если кэш сбросили, пока грузили, — значение могло устареть, не сохраняем
+        if gen == _CACHESTATE["gen"]:
+            _CACHE[key] = value
+    return value
+
+
+def cacheset(key: str, value: Any, version: int) -> None:
+    with _CACHELOCK:
+        # Следующий номер после известного — это наша запись; иначе между ними писал кто-то ещё
+        if _CACHESTATE["path"] != str(DBPATH) or version != (_CACHESTATE["version"] or 0) + 1:
+            _cacheclear(version)
+            _CACHESTATE["path"] = str(DBPATH)
+            _CACHESTATE["checked"] = time.monotonic()
+        _CACHESTATE["version"] = version
+        _CACHE[key] = value
+
+
+def _ensurecolumn(conn: sqlite3.Connection, table: str, column: str, decl: str) -> None:
+    cols = {r["name"] for r in conn.execute(f"PRAGMA table_info({table})")}
+    if column not in cols:
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+
+
 def initdb() -> None:
     with db() as conn:
         conn.execute(
@@ -193,6 +317,54 @@ def initdb() -> None:
             """
         )
 
+        _ensurecolumn(conn, "jobs", "attempts", "INTEGER NOT NULL DEFAULT 0")
+        _ensurecolumn(conn, "jobs", "notbefore", "REAL")
+        _ensurecolumn(conn, "jobs", "progress", "TEXT")
+        _ensurecolumn(conn, "jobs", "updatedseq", "INTEGER NOT NULL DEFAULT 0")
+        conn.execute("CREATE INDEX IF NOT EXISTS jobs_createdat ON jobs(createdat, id)")
+        conn.execute("CREATE INDEX IF NOT EXISTS jobs_appid_createdat ON jobs(appid, createdat, id)")
+        conn.execute("CREATE INDEX IF NOT EXISTS jobs_updatedseq ON jobs(updatedseq)")
+        conn.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        conn.execute("INSERT OR IGNORE INTO counters(name, value) SELECT 'jobs', COALESCE(MAX(updatedseq), 0) FROM jobs")
+        conn.execute("INSERT OR IGNORE INTO counters(name, value) VALUES('config', 0)")
+
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS imagepulls (
+              image TEXT PRIMARY KEY,
+              imageid TEXT,
+              digest TEXT,
+              pulledat REAL,
+              remotedigest TEXT,
+              checkedat REAL
+            )
+            """
+        )
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS apppull (
+              appid TEXT PRIMARY KEY,
+              policy TEXT NOT NULL,
+              maxagehours REAL,
+              updatedat TEXT NOT NULL
+            )
+            """
+        )
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS backups (
+              id TEXT PRIMARY KEY,
+              createdat TEXT NOT NULL,
+              files INTEGER NOT NULL,
+              bytes INTEGER NOT NULL,
+              newbytes INTEGER NOT NULL,
+              storedbytes INTEGER NOT NULL,
+              skipped INTEGER NOT NULL,
+              seconds REAL NOT NULL
+            )
+            """
+        )
+
         cur = conn.execute("SELECT id FROM settings WHERE id=1")
         if cur.fetchone() is None:
             conn.execute(
@@ -209,16 +381,357 @@ def initdb() -> None:
 
 
 @app.on_event("startup")
-def _startup():
+async def _startup():
+    global _SAMPLERTASK, _JOBPRUNETASK, _LOOP
+    _LOOP = asyncio.get_running_loop()
     initdb()
     APPSDIR.mkdir(parents=True, exist_ok=True)
     ICONSDIR.mkdir(parents=True, exist_ok=True)
+    recoverjobs()
+    # Первый снимок сразу, чтобы /api/tiles не отдавал пустоту до первого тика. В историю он не идёт:
+    # CPU и скорости сети/диска в нём посчитаны за почти нулевой интервал — первая точка начнётся с тика сэмплера
+    await runio(sample_metrics)
+    _SAMPLERTASK = asyncio.create_task(metrics_sampler())
+    _JOBPRUNETASK = asyncio.create_task(jobs_pruner())
+    containerstate_start()
+    logarchive_start()
+    containerstats_start()
+    instrumentation_start()
+
+
+@app.on_event("shutdown")
+async def _shutdown():
+    for task in (_SAMPLERTASK, _JOBPRUNETASK):
+        if task:
+            task.cancel()
+    containerstate_stop()
+    logarchive_stop()
+    containerstats_stop()
+    instrumentation_stop()
+    for ex in POOLS.values():
+        ex.shutdown(wait=False, cancel_futures=True)
+
+
+# ---------------- Executors ----------------
+# Блокирующая работа не выполняется в event loop. Два отдельных ограниченных пула:
+# cpu — bcrypt и сжатие (по числу ядер), io — Docker, git, SQLite, файлы (шире: потоки в основном ждут).
+# Сверх POOLQUEUE задач на поток корутины ждут на семафоре в loop, а не копятся в очереди пула.
+CPUWORKERS = max(1, int(os.environ.get("SERVER_UI_CPU_WORKERS", str(os.cpu_count() or 1))))
+IOWORKERS = max(1, int(os.environ.get("SERVER_UI_IO_WORKERS", "16")))
+POOLQUEUE = 4
+POOLS = {
+    "cpu": ThreadPoolExecutor(max_workers=CPUWORKERS, thread_name_prefix="cpu"),
+    "io": ThreadPoolExecutor(max_workers=IOWORKERS, thread_name_prefix="io"),
+}
+_POOLSEM = {"cpu": asyncio.Semaphore(CPUWORKERS * POOLQUEUE), "io": asyncio.Semaphore(IOWORKERS * POOLQUEUE)}
+_POOLSTATS = {
+    name: {"workers": ex._max_workers, "waiting": 0, "queued": 0, "running": 0, "done": 0, "waitsum": 0.0}
+    for name, ex in POOLS.items()
+}
+_POOLLOCK = threading.Lock()
+
+
+def poolsubmit(pool: str, fn, *args, **kwargs):
+    """Отправка в пул из любого потока, с учётом в _POOLSTATS. Возвращает concurrent.futures.Future."""
+    st = _POOLSTATS[pool]
+    queuedat = time.monotonic()
+    with _POOLLOCK:
+        st["queued"] += 1
+
+    def call():
+        with _POOLLOCK:
+            st["queued"] -= 1
+            st["running"] += 1
+            st["waitsum"] += time.monotonic() - queuedat
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with _POOLLOCK:
+                st["running"] -= 1
+                st["done"] += 1
+
+    def ondone(f) -> None:
+        if f.cancelled():
+            with _POOLLOCK:
+                st["queued"] -= 1
+
+    fut = POOLS[pool].submit(call)
+    fut.add_done_callback(ondone)
+    return fut
+
+
+async def runin(pool: str, fn, *args, **kwargs):
+    st = _POOLSTATS[pool]
+    with _POOLLOCK:
+        st["waiting"] += 1
+    try:
+        await _POOLSEM[pool].acquire()
+    finally:
+        with _POOLLOCK:
+            st["waiting"] -= 1
+    try:
+        return await asyncio.wrap_future(poolsubmit(pool, fn, *args, **kwargs))
+    finally:
+        _POOLSEM[pool].release()
+
+
+async def runcpu(fn, *args, **kwargs):
+    return await runin("cpu", fn, *args, **kwargs)
+
+
+async def runio(fn, *args, **kwargs):
+    return await runin("io", fn, *args, **kwargs)
+
+
+def poolstats() -> dict[str, dict]:
+    with _POOLLOCK:
+        return {name: dict(st) for name, st in _POOLSTATS.items()}
+
+
+# ---------------- Instrumentation ----------------
+# Латентность по маршрутам (фиксированные корзины), запросы в работе, лаг event loop, очереди пулов —
+# всё в /metrics в текстовом формате Prometheus. Латентность считается до начала ответа (для SSE и
+# потоковых выгрузок — до заголовков), «в работе» — до конца тела.
+# SERVER_UI_SLOW_MS > 0 включает сторожевой поток и пульс loop (отметка раз в SLOWSAMPLE). Если пульс
+# опаздывает — loop занят, и поток снимает его стек: для запросов дольше порога (в лог по завершении)
+# или как общую блокировку. Занятость решает пульс, а не имя файла в стеке: у uvloop нет selectors.py.
+LATENCYBUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LAGBUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+LAGINTERVAL = 0.5
+SLOWMS = float(os.environ.get("SERVER_UI_SLOW_MS", "0"))
+SLOWSAMPLE = 0.05
+SLOWMAXSAMPLES = 50
+METRICSTOKEN = os.environ.get("SERVER_UI_METRICS_TOKEN", "")
+ROUTECACHEMAX = 2048
+
+_HTTPSTATS: dict[tuple[str, str], dict[str, Any]] = {}
+_HTTPCODES: Counter = Counter()
+_INFLIGHT: Counter = Counter()
+_ACTIVE: dict[int, dict[str, Any]] = {}
+_ROUTECACHE: dict[tuple[str, str], str] = {}
+_LAG: dict[str, Any] = {"last": 0.0, "max": 0.0, "beat": 0.0, "buckets": [0] * (len(LAGBUCKETS) + 1), "count": 0, "sum": 0.0}
+_LAGTASK: asyncio.Task | None = None
+_BEATTASK: asyncio.Task | None = None
+_LOOPTHREAD: int | None = None
+_WATCHSTOP = threading.Event()
+_SLOWLOG = logging.getLogger("uvicorn.error")
+
+
+def _bucketindex(buckets: tuple, value: float) -> int:
+    for i, le in enumerate(buckets):
+        if value <= le:
+            return i
+    return len(buckets)
+
+
+def routelabel(scope: dict) -> str:
+    """Шаблон маршрута (/api/apps/{appid}), а не сам путь — иначе метки размножаются."""
+    key = (scope["method"], scope["path"])
+    label = _ROUTECACHE.get(key)
+    if label is None:
+        label = "other"
+        for route in app.router.routes:
+            match, _ = route.matches(scope)
+            if match != Match.NONE:
+                label = getattr(route, "path", "other") or "other"
+                if match == Match.FULL:
+                    break
+        if len(_ROUTECACHE) >= ROUTECACHEMAX:
+            _ROUTECACHE.clear()
+        _ROUTECACHE[key] = label
+    return label
+
+
+def _observe(method: str, route: str, code: int, seconds: float) -> None:
+    st = _HTTPSTATS.get((method, route))
+    if st is None:
+        st = _HTTPSTATS[(method, route)] = {"buckets": [0] * (len(LATENCYBUCKETS) + 1), "count": 0, "sum": 0.0}
+    st["buckets"][_bucketindex(LATENCYBUCKETS, seconds)] += 1
+    st["count"] += 1
+    st["sum"] += seconds
+    _HTTPCODES[(method, route, code)] += 1
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        method = scope["method"]
+        route = routelabel(scope)
+        started = time.perf_counter()
+        state = {"code": 500, "observed": False}
+        req = {"route": route, "method": method, "started": started, "samples": Counter(), "responded": False}
+        _ACTIVE[id(req)] = req
+        _INFLIGHT[route] += 1
+
+        async def sendwrap(message):
+            if message["type"] == "http.response.start":
+                state["code"] = message["status"]
+                state["observed"] = True
+                req["responded"] = True
+                _observe(method, route, state["code"], time.perf_counter() - started)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, sendwrap)
+        finally:
+            _INFLIGHT[route] -= 1
+            _ACTIVE.pop(id(req), None)
+            if not state["observed"]:
+                _observe(method, route, state["code"], time.perf_counter() - started)
+            if req["samples"]:
+                _logslow(req, time.perf_counter() - started)
+
+
+app.add_middleware(MetricsMiddleware)
+
+
+async def loopwatch() -> None:
+    """Лаг loop: насколько позже заказанного просыпается sleep(LAGINTERVAL)."""
+    while True:
+        t = time.perf_counter()
+        await asyncio.sleep(LAGINTERVAL)
+        lag = max(0.0, time.perf_counter() - t - LAGINTERVAL)
+        _LAG["last"] = lag
+        _LAG["max"] = max(_LAG["max"], lag)
+        _LAG["buckets"][_bucketindex(LAGBUCKETS, lag)] += 1
+        _LAG["count"] += 1
+        _LAG["sum"] += lag
+
+
+async def loopbeat() -> None:
+    while True:
+        _LAG["beat"] = time.perf_counter()
+        await asyncio.sleep(SLOWSAMPLE)
+
+
+def _loopstack() -> str | None:
+    frame = sys._current_frames().get(_LOOPTHREAD) if _LOOPTHREAD else None
+    if frame is None:
+        return None
+    return "".join(traceback.format_stack(frame, limit=12))
+
+
+def slowwatch() -> None:
+    threshold = SLOWMS / 1000.0
+    blocked = Counter()
+    while not _WATCHSTOP.wait(SLOWSAMPLE):
+        now = time.perf_counter()
+        # Пульс пропустил хотя бы один такт — loop выполняет код, а не ждёт ввода-вывода
+        busy = _LAG["beat"] and now - _LAG["beat"] > 2 * SLOWSAMPLE
+        if not busy:
+            n = sum(blocked.values())
+            if n and n * SLOWSAMPLE >= threshold:
+                top, _ = blocked.most_common(1)[0]
+                _SLOWLOG.warning("event loop заблокирован ~%.0f мс, стек потока loop:\n%s", n * SLOWSAMPLE * 1000, top)
+            blocked.clear()
+            continue
+        stack = _loopstack()
+        if not stack:
+            continue
+        slow = [r for r in list(_ACTIVE.values()) if not r["responded"] and now - r["started"] > threshold and sum(r["samples"].values()) < SLOWMAXSAMPLES]
+        for r in slow:
+            r["samples"][stack] += 1
+        if not slow:
+            blocked[stack] += 1
+
+
+def _logslow(req: dict, seconds: float) -> None:
+    total = sum(req["samples"].values())
+    lines = [f"медленный запрос {req['method']} {req['route']}: {seconds * 1000:.0f} мс, {total} снимков стека loop"]
+    for stack, n in req["samples"].most_common(3):
+        lines.append(f"--- {n}/{total}:\n{stack}")
+    _SLOWLOG.warning("\n".join(lines))
+
+
+def instrumentation_start() -> None:
+    global _LAGTASK, _BEATTASK, _LOOPTHREAD
+    _LOOPTHREAD = threading.get_ident()
+    _LAGTASK = asyncio.create_task(loopwatch())
+    if SLOWMS > 0:
+        _BEATTASK = asyncio.create_task(loopbeat())
+        _WATCHSTOP.clear()
+        threading.Thread(target=slowwatch, name="slowwatch", daemon=True).start()
+
+
+def instrumentation_stop() -> None:
+    _WATCHSTOP.set()
+    for task in (_LAGTASK, _BEATTASK):
+        if task:
+            task.cancel()
+
+
+def _promlabels(**labels) -> str:
+    def esc(v) -> str:
+        return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in labels.items()) + "}"
+
+
+def _promhistogram(out: list[str], name: str, buckets: tuple, counts: list[int], total: float, count: int, **labels) -> None:
+    acc = 0
+    for le, n in zip(buckets, counts):
+        acc += n
+        out.append(f"{name}_bucket{_promlabels(**labels, le=le)} {acc}")
+    out.append(f"{name}_bucket{_promlabels(**labels, le='+Inf')} {count}")
+    suffix = _promlabels(**labels) if labels else ""
+    out.append(f"{name}_sum{suffix} {total:.6f}")
+    out.append(f"{name}_count{suffix} {count}")
+
+
+def rendermetrics() -> str:
+    out: list[str] = []
+    out.append("# HELP serverui_http_request_duration_seconds Время до начала ответа по маршрутам.")
+    out.append("# TYPE serverui_http_request_duration_seconds histogram")
+    for (method, route), st in sorted(_HTTPSTATS.items()):
+        _promhistogram(out, "serverui_http_request_duration_seconds", LATENCYBUCKETS, st["buckets"], st["sum"], st["count"], method=method, route=route)
+    out.append("# TYPE serverui_http_requests_total counter")
+    for (method, route, code), n in sorted(_HTTPCODES.items()):
+        out.append(f"serverui_http_requests_total{_promlabels(method=method, route=route, code=code)} {n}")
+    out.append("# TYPE serverui_http_requests_in_flight gauge")
+    for route, n in sorted(_INFLIGHT.items()):
+        out.append(f"serverui_http_requests_in_flight{_promlabels(route=route)} {n}")
+
+    out.append("# HELP serverui_event_loop_lag_seconds Опоздание пробуждения loop.")
+    out.append("# TYPE serverui_event_loop_lag_seconds histogram")
+    _promhistogram(out, "serverui_event_loop_lag_seconds", LAGBUCKETS, _LAG["buckets"], _LAG["sum"], _LAG["count"])
+    out.append("# TYPE serverui_event_loop_lag_last_seconds gauge")
+    out.append(f"serverui_event_loop_lag_last_seconds {_LAG['last']:.6f}")
+    out.append("# TYPE serverui_event_loop_lag_max_seconds gauge")
+    out.append(f"serverui_event_loop_lag_max_seconds {_LAG['max']:.6f}")
+
+    pools = poolstats()
+    for key, kind in (("workers", "gauge"), ("waiting", "gauge"), ("queued", "gauge"), ("running", "gauge")):
+        out.append(f"# TYPE serverui_pool_{key} {kind}")
+        for name, st in pools.items():
+            out.append(f"serverui_pool_{key}{_promlabels(pool=name)} {st[key]}")
+    out.append("# TYPE serverui_pool_tasks_total counter")
+    out.append("# TYPE serverui_pool_wait_seconds_total counter")
+    for name, st in pools.items():
+        out.append(f"serverui_pool_tasks_total{_promlabels(pool=name)} {st['done']}")
+        out.append(f"serverui_pool_wait_seconds_total{_promlabels(pool=name)} {st['waitsum']:.6f}")
+
+    out.append("# TYPE serverui_jobs_queued gauge")
+    out.append(f"serverui_jobs_queued {len(_JOBQUEUE)}")
+    out.append("# TYPE serverui_jobs_running gauge")
+    out.append(f"serverui_jobs_running {len(_JOBRUNNING)}")
+    out.append("# TYPE serverui_event_subscribers gauge")
+    out.append(f"serverui_event_subscribers {len(_SUBSCRIBERS)}")
+    return "\n".join(out) + "\n"
 
 
 # ---------------- Auth helpers ----------------
-def getsingleuser():
+def _loadsingleuser() -> dict | None:
     with db() as conn:
-        return conn.execute("SELECT id, username, passwordhash, createdat FROM users WHERE id=1").fetchone()
+        row = conn.execute("SELECT id, username, passwordhash, createdat FROM users WHERE id=1").fetchone()
+    return dict(row) if row else None
+
+
+def getsingleuser() -> dict | None:
+    return cacheget("user", _loadsingleuser)
 
 
 def firstrun() -> bool:
@@ -227,11 +740,14 @@ def firstrun() -> bool:
 
 def createsingleuser(username: str, password: str) -> None:
     pwhash = bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+    createdat = datetime.utcnow().isoformat()
     with db() as conn:
         conn.execute(
             "INSERT INTO users(id, username, passwordhash, createdat) VALUES(1, ?, ?, ?)",
-            (username, pwhash, datetime.utcnow().isoformat()),
+            (username, pwhash, createdat),
         )
+        version = configbump(conn)
+    cacheset("user", {"id": 1, "username": username, "passwordhash": pwhash, "createdat": createdat}, version)
 
 
 def verifylogin(username: str, password: str) -> bool:
@@ -247,6 +763,10 @@ def setpassword(newpassword: str) -> None:
     pwhash = bcrypt.hashpw(newpassword.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
     with db() as conn:
         conn.execute("UPDATE users SET passwordhash=? WHERE id=1", (pwhash,))
+        version = configbump(conn)
+    u = _loadsingleuser()
+    if u:
+        cacheset("user", u, version)
 
 
 def require_auth_api(request: Request) -> JSONResponse | None:
@@ -264,12 +784,16 @@ def require_auth_page(request: Request) -> RedirectResponse | None:
 
 
 # ---------------- Settings ----------------
-def gettheme() -> str:
+def _loadtheme() -> str:
     with db() as conn:
         row = conn.execute("SELECT theme FROM settings WHERE id=1").fetchone()
     return (row["theme"] if row else "dark") or "dark"
 
 
+def gettheme() -> str:
+    return cacheget("theme", _loadtheme)
+
+
 def settheme(theme: str) -> None:
     theme = theme if theme in ("dark", "light") else "dark"
     with db() as conn:
@@ -277,6 +801,8 @@ def settheme(theme: str) -> None:
             "UPDATE settings SET theme=?, updatedat=? WHERE id=1",
             (theme, datetime.utcnow().isoformat()),
         )
+        version = configbump(conn)
+    cacheset("theme", theme, version)
 
 
 # ---------------- Widgets config ----------------
@@ -323,7 +849,15 @@ def _sanitize_layout(layout: list[dict], widgets: list[str]) -> list[dict]:
     return out
 
 
+def _copy_widgets_config(cfg: dict[str, Any]) -> dict[str, Any]:
+    return {"widgets": list(cfg["widgets"]), "layout": [dict(x) for x in cfg["layout"]]}
+
+
 def get_widgets_config() -> dict[str, Any]:
+    return _copy_widgets_config(cacheget("widgets", _load_widgets_config))
+
+
+def _load_widgets_config() -> dict[str, Any]:
     with db() as conn:
         row = conn.execute("SELECT widgets, layout FROM widgetsconfig WHERE id=1").fetchone()
     if not row:
@@ -357,10 +891,26 @@ def set_widgets_config(widgets: list[str], layout: list[dict]) -> dict[str, Any]
             "UPDATE widgetsconfig SET widgets=?, layout=?, updatedat=? WHERE id=1",
             (json.dumps(widgets), json.dumps(layout), datetime.utcnow().isoformat()),
         )
-    return {"widgets": widgets, "layout": layout}
+        version = configbump(conn)
+    cfg = {"widgets": widgets, "layout": layout}
+    cacheset("widgets", _copy_widgets_config(cfg), version)
+    return cfg
 
 
 # ---------------- Jobs ----------------
+# Каждое изменение строки задачи получает новый номер из counters('jobs') в той же транзакции —
+# клиенты забирают только строки с updatedseq больше последнего увиденного.
+def _touchjob(conn: sqlite3.Connection, jobid: str) -> None:
+    conn.execute("UPDATE counters SET value=value+1 WHERE name='jobs'")
+    conn.execute("UPDATE jobs SET updatedseq=(SELECT value FROM counters WHERE name='jobs') WHERE id=?", (jobid,))
+
+
+def jobsseq() -> int:
+    with db() as conn:
+        row = conn.execute("SELECT value FROM counters WHERE name='jobs'").fetchone()
+    return int(row[0]) if row else 0
+
+
 def createjob(kind: str, appid: str, action: str | None = None) -> str:
     jobid = uuid.uuid4().hex
     now = datetime.utcnow().isoformat()
@@ -372,6 +922,8 @@ def createjob(kind: str, appid: str, action: str | None = None) -> str:
             """,
             (jobid, kind, appid, action, "queued", now),
         )
+        _touchjob(conn, jobid)
+    publishjob(jobid)
     return jobid
 
 
@@ -407,32 +959,413 @@ def jobsetstatus(jobid: str, status: str, message: str | None = None, started: b
             )
         else:
             conn.execute("UPDATE jobs SET status=?, message=? WHERE id=?", (status, message, jobid))
+        _touchjob(conn, jobid)
+    publishjob(jobid)
+
+
+def getjob(jobid: str) -> dict | None:
+    with db() as conn:
+        row = conn.execute(
+            f"SELECT {JOBCOLUMNS} FROM jobs WHERE id=?",
+            (jobid,),
+        ).fetchone()
+    return _jobrow(row) if row else None
+
+
+def _jobrow(row: sqlite3.Row) -> dict:
+    job = dict(row)
+    try:
+        job["progress"] = json.loads(job["progress"]) if job.get("progress") else None
+    except ValueError:
+        job["progress"] = None
+    return job
+
+
+JOBPROGRESSINTERVAL = 1.0
+
+
+def jobprogress(jobid: str):
+    """Колбэк прогресса для задачи: пишет в jobs.progress не чаще раза в секунду (последнее — всегда)."""
+    last = {"t": 0.0}
+
+    def report(data: dict, final: bool = False) -> None:
+        now = time.monotonic()
+        if not final and now - last["t"] < JOBPROGRESSINTERVAL:
+            return
+        last["t"] = now
+        with db() as conn:
+            conn.execute("UPDATE jobs SET progress=? WHERE id=?", (json.dumps(data), jobid))
+            _touchjob(conn, jobid)
+        publishjob(jobid)
+
+    return report
 
 
-def getjobs(limit: int = 50) -> list[dict]:
+def publishjob(jobid: str) -> None:
+    notifyjobs()
+    if not _SUBSCRIBERS:
+        return
+    job = getjob(jobid)
+    if job:
+        publish("job", job)
+
+
+JOBCOLUMNS = "id, kind, appid, action, status, createdat, startedat, finishedat, message, attempts, progress, updatedseq"
+JOBWAITMAX = 30.0
+_JOBWAITERS: set[asyncio.Future] = set()
+
+
+def _wakejobwaiters() -> None:
+    for fut in list(_JOBWAITERS):
+        if not fut.done():
+            fut.set_result(None)
+
+
+def notifyjobs() -> None:
+    """Будит long-poll запросы /api/jobs?since_seq. Можно вызывать из любого потока."""
+    loop = _LOOP
+    if loop is None:
+        return
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        _wakejobwaiters()
+    else:
+        loop.call_soon_threadsafe(_wakejobwaiters)
+
+
+def jobwaiter() -> asyncio.Future:
+    """Регистрирует ожидание до чтения jobsseq: изменение между чтением и ожиданием не потеряется."""
+    fut = asyncio.get_running_loop().create_future()
+    _JOBWAITERS.add(fut)
+    return fut
+
+
+async def waitjobs(fut: asyncio.Future, timeout: float) -> None:
+    try:
+        await asyncio.wait_for(fut, timeout)
+    except asyncio.TimeoutError:
+        pass
+
+
+def jobschanged(sinceseq: int, limit: int = 200) -> list[dict]:
     with db() as conn:
         rows = conn.execute(
-            """
-            SELECT id, kind, appid, action, status, createdat, startedat, finishedat, message
-            FROM jobs
-            ORDER BY createdat DESC
-            LIMIT ?
-            """,
-            (int(limit),),
+            f"SELECT {JOBCOLUMNS} FROM jobs WHERE updatedseq > ? ORDER BY updatedseq LIMIT ?",
+            (int(sinceseq), int(limit)),
         ).fetchall()
-    return [dict(r) for r in rows]
+    return [_jobrow(r) for r in rows]
+
+
+def jobcursor(job: dict) -> str:
+    raw = f"{job['createdat']}|{job['id']}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def parsejobcursor(cursor: str) -> tuple[str, str] | None:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+    except (ValueError, UnicodeDecodeError):
+        return None
+    createdat, sep, jobid = raw.partition("|")
+    return (createdat, jobid) if sep and createdat and jobid else None
+
+
+def getjobs(limit: int = 50, before: tuple[str, str] | None = None, appid: str | None = None, statuses: list[str] | None = None) -> list[dict]:
+    """Задачи от новых к старым. Постраничность по ключу (createdat, id): before — последняя строка прошлой страницы."""
+    where: list[str] = []
+    args: list[Any] = []
+    if appid:
+        where.append("appid=?")
+        args.append(appid)
+    if statuses:
+        where.append(f"status IN ({','.join('?' * len(statuses))})")
+        args.extend(statuses)
+    if before:
+        where.append("(createdat < ? OR (createdat = ? AND id < ?))")
+        args.extend([before[0], before[0], before[1]])
+    sql = f"SELECT {JOBCOLUMNS} FROM jobs"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY createdat DESC, id DESC LIMIT ?"
+    args.append(int(limit))
+    with db() as conn:
+        rows = conn.execute(sql, args).fetchall()
+    return [_jobrow(r) for r in rows]
+
+
+# ---------------- Jobs retention ----------------
+# Завершённые задачи старше JOBKEEPDAYS или сверх последних JOBKEEPROWS удаляются пачками раз в час.
+# Очередь (queued/running) не трогаем. Если после чистки в файле много свободных страниц — VACUUM.
+JOBKEEPDAYS = float(os.environ.get("SERVER_UI_JOB_KEEP_DAYS", "30"))
+JOBKEEPROWS = int(os.environ.get("SERVER_UI_JOB_KEEP_ROWS", "5000"))
+JOBPRUNEINTERVAL = 3600.0
+JOBPRUNEBATCH = 1000
+JOBVACUUMRATIO = 0.3
+
+_JOBPRUNETASK: asyncio.Task | None = None
+
+
+def prunejobs() -> int:
+    done = "status NOT IN ('queued', 'running')"
+    cutoff = (datetime.utcnow() - timedelta(days=JOBKEEPDAYS)).isoformat()
+    deleted = 0
+    while True:
+        with db() as conn:
+            n = conn.execute(
+                f"DELETE FROM jobs WHERE id IN (SELECT id FROM jobs WHERE {done} AND createdat < ? LIMIT ?)",
+                (cutoff, JOBPRUNEBATCH),
+            ).rowcount
+        deleted += n
+        if n < JOBPRUNEBATCH:
+            break
+    while JOBKEEPROWS > 0:
+        with db() as conn:
+            n = conn.execute(
+                f"DELETE FROM jobs WHERE id IN (SELECT id FROM jobs WHERE {done} ORDER BY createdat DESC, id DESC LIMIT ? OFFSET ?)",
+                (JOBPRUNEBATCH, JOBKEEPROWS),
+            ).rowcount
+        deleted += n
+        if n < JOBPRUNEBATCH:
+            break
+    if deleted:
+        conn = db()
+        pages = conn.execute("PRAGMA page_count").fetchone()[0]
+        free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if pages and free / pages > JOBVACUUMRATIO:
+            conn.execute("VACUUM")
+        conn.execute("PRAGMA optimize")
+    return deleted
+
+
+async def jobs_pruner():
+    while True:
+        try:
+            await runio(prunejobs)
+        except sqlite3.Error:
+            pass
+        await asyncio.sleep(JOBPRUNEINTERVAL)
+
+
+# ---------------- Job scheduler ----------------
+# Общий лимит одновременных задач; задачи одного приложения выполняются строго по очереди (FIFO),
+# между приложениями первой берётся задача с меньшим приоритетом (stop/start раньше установок с pull).
+# Очередь живёт в таблице jobs: после перезапуска queued-задачи подхватываются заново,
+# прерванные running — повторяются (или падают, если попытки кончились).
+JOBWORKERS = max(1, int(os.environ.get("SERVER_UI_JOB_WORKERS", "2")))
+JOBPRIORITY = {"stop": 0, "down": 0, "start": 1, "restart": 1}
+JOBPRIORITYDEFAULT = 5
+JOBMAXATTEMPTS = max(1, int(os.environ.get("SERVER_UI_JOB_ATTEMPTS", "4")))
+JOBBACKOFF = 5.0
+JOBBACKOFFMAX = 300.0
+
+_JOBQUEUE: list[dict[str, Any]] = []
+_JOBRUNNING: dict[str, str] = {}
+_JOBSEQ = 0
+_JOBWAKE: asyncio.TimerHandle | None = None
+
+
+class TransientJobError(Exception):
+    """Временная ошибка (Docker перезапускается, таймаут, 502/503/504) — задачу стоит повторить."""
 
 
-async def runjobinthread(jobid: str, fn, *args):
+# Обычный 500 от демона — чаще постоянная ошибка (порт занят, имя контейнера занято, кривой mount):
+# повтор даст то же самое, поэтому задача падает сразу
+TRANSIENTSTATUS = (502, 503, 504)
+
+
+def _istransient(e: Exception) -> bool:
+    if isinstance(e, APIError):
+        return e.status_code in TRANSIENTSTATUS
+    return isinstance(e, (RequestsConnectionError, Timeout))
+
+
+def jobhandler(kind: str):
+    return {
+        "install": lambda appid, action, progress: installapp(appid, progress),
+        "action": lambda appid, action, progress: actionapp(appid, action),
+        "backup": lambda appid, action, progress: backupjob(action, progress),
+    }.get(kind)
+
+
+def _enqueue(jobid: str, kind: str, appid: str, action: str | None, attempts: int = 0, notbefore: float | None = None) -> None:
+    global _JOBSEQ
+    _JOBSEQ += 1
+    _JOBQUEUE.append(
+        {
+            "id": jobid,
+            "kind": kind,
+            "appid": appid,
+            "action": action,
+            "priority": JOBPRIORITY.get(action or kind, JOBPRIORITYDEFAULT),
+            "seq": _JOBSEQ,
+            "attempts": attempts,
+            "notbefore": notbefore or 0.0,
+        }
+    )
+
+
+async def submitjob(kind: str, appid: str, action: str | None = None) -> str:
+    jobid = await runio(createjob, kind, appid, action)
+    _enqueue(jobid, kind, appid, action)
+    dispatchjobs()
+    return jobid
+
+
+def recoverjobs() -> None:
+    """Вызывается при старте, до приёма запросов."""
+    now = datetime.utcnow().isoformat()
+    with db() as conn:
+        rows = conn.execute(
+            "SELECT id, kind, appid, action, status, attempts, notbefore FROM jobs WHERE status IN ('queued', 'running') ORDER BY createdat"
+        ).fetchall()
+        for r in rows:
+            if r["status"] == "running" and r["attempts"] >= JOBMAXATTEMPTS:
+                conn.execute(
+                    "UPDATE jobs SET status='error', message=?, finishedat=? WHERE id=?",
+                    ("Прервано перезапуском сервера", now, r["id"]),
+                )
+                _touchjob(conn, r["id"])
+            elif r["status"] == "running":
+                conn.execute("UPDATE jobs SET status='queued', message=? WHERE id=?", ("Повтор после перезапуска", r["id"]))
+                _touchjob(conn, r["id"])
+    for r in rows:
+        if r["status"] == "running" and r["attempts"] >= JOBMAXATTEMPTS:
+            continue
+        if jobhandler(r["kind"]) is None:
+            jobsetstatus(r["id"], "error", message="Неизвестный тип задачи", finished=True)
+            continue
+        _enqueue(r["id"], r["kind"], r["appid"], r["action"], attempts=r["attempts"], notbefore=r["notbefore"])
+    dispatchjobs()
+
+
+def dispatchjobs() -> None:
+    global _JOBWAKE
+    now = time.time()
+    while len(_JOBRUNNING) < JOBWORKERS:
+        busy = set(_JOBRUNNING.values())
+        heads: dict[str, dict] = {}
+        for it in _JOBQUEUE:
+            if it["appid"] in busy:
+                continue
+            cur = heads.get(it["appid"])
+            if cur is None or it["seq"] < cur["seq"]:
+                heads[it["appid"]] = it
+        # Задача в паузе перед повтором держит очередь своего приложения
+        ready = [it for it in heads.values() if it["notbefore"] <= now]
+        if not ready:
+            waits = [it["notbefore"] for it in heads.values()]
+            if waits:
+                if _JOBWAKE:
+                    _JOBWAKE.cancel()
+                _JOBWAKE = asyncio.get_running_loop().call_later(max(0.0, min(waits) - now), dispatchjobs)
+            return
+        it = min(ready, key=lambda x: (x["priority"], x["seq"]))
+        _JOBQUEUE.remove(it)
+        _JOBRUNNING[it["id"]] = it["appid"]
+        asyncio.create_task(_runjob(it))
+
+
+async def _runjob(it: dict) -> None:
+    try:
+        await runjobinthread(it)
+    finally:
+        _JOBRUNNING.pop(it["id"], None)
+        dispatchjobs()
+
+
+async def canceljob(jobid: str) -> bool:
+    for it in _JOBQUEUE:
+        if it["id"] == jobid:
+            _JOBQUEUE.remove(it)
+            await runio(jobsetstatus, jobid, "cancelled", message="Отменено", finished=True)
+            return True
+    return False
+
+
+def jobretry(jobid: str, attempts: int, delay: float, message: str) -> None:
+    with db() as conn:
+        conn.execute(
+            "UPDATE jobs SET status='queued', message=?, attempts=?, notbefore=? WHERE id=?",
+            (message, attempts, time.time() + delay, jobid),
+        )
+        _touchjob(conn, jobid)
+    publishjob(jobid)
+
+
+def jobbegin(jobid: str, attempts: int) -> None:
+    with db() as conn:
+        conn.execute("UPDATE jobs SET attempts=?, notbefore=NULL WHERE id=?", (attempts, jobid))
     jobsetstatus(jobid, "running", started=True)
+
+
+async def runjobinthread(it: dict):
+    # Записи в jobs (и getjob в publishjob) — тоже через io-пул: в loop нет синхронного SQLite
+    jobid = it["id"]
+    it["attempts"] += 1
+    await runio(jobbegin, jobid, it["attempts"])
     try:
-        ok, msg = await asyncio.to_thread(fn, *args)
-        if ok:
-            jobsetstatus(jobid, "success", message=msg, finished=True)
-        else:
-            jobsetstatus(jobid, "error", message=msg, finished=True)
+        # Задачи идут минутами — держим их в пуле по умолчанию, чтобы не занимать io-пул запросов
+        ok, msg = await asyncio.to_thread(jobhandler(it["kind"]), it["appid"], it["action"], jobprogress(jobid))
+        status = "success" if ok else "error"
+        await runio(jobsetstatus, jobid, status, message=msg, finished=True)
+    except TransientJobError as e:
+        msg = str(e)
+        if it["attempts"] >= JOBMAXATTEMPTS:
+            await runio(jobsetstatus, jobid, "error", message=msg, finished=True)
+            return
+        delay = min(JOBBACKOFFMAX, JOBBACKOFF * 2 ** (it["attempts"] - 1))
+        await runio(jobretry, jobid, it["attempts"], delay, f"Попытка {it['attempts']}: {e}; повтор через {delay:.0f} с")
+        it["notbefore"] = time.time() + delay
+        _JOBQUEUE.append(it)
     except Exception as e:
-        jobsetstatus(jobid, "error", message=str(e), finished=True)
+        msg = str(e)
+        await runio(jobsetstatus, jobid, "error", message=msg, finished=True)
+
+
+# ---------------- Push events (SSE) ----------------
+# Один канал на вкладку вместо опроса /api/tiles, /api/jobs и /api/apps.
+# Сообщение сериализуется один раз и раскладывается по очередям подписчиков.
+EVENTQUEUE = 256
+EVENTHEARTBEAT = 15.0
+
+_SUBSCRIBERS: set[asyncio.Queue] = set()
+_LOOP: asyncio.AbstractEventLoop | None = None
+
+
+def _broadcast(msg: str) -> None:
+    for q in list(_SUBSCRIBERS):
+        if q.full():
+            # Клиент не успевает читать — закрываем поток, EventSource переподключится и возьмёт свежее состояние
+            _SUBSCRIBERS.discard(q)
+            while not q.empty():
+                q.get_nowait()
+            q.put_nowait(None)
+            continue
+        q.put_nowait(msg)
+
+
+def publish(topic: str, data: Any) -> None:
+    """Можно вызывать из любого потока."""
+    loop = _LOOP
+    if loop is None or not _SUBSCRIBERS:
+        return
+    msg = f"event: {topic}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        _broadcast(msg)
+    else:
+        loop.call_soon_threadsafe(_broadcast, msg)
+
+
+def publishtiles() -> None:
+    if _SUBSCRIBERS:
+        publish("tiles", build_tiles_for_widgets(get_widgets_config()["widgets"]))
 
 
 # ---------------- Metrics ----------------
@@ -483,13 +1416,55 @@ def get_cpu_temp_c():
     return None
 
 
+SKIPFSTYPES = ("tmpfs", "devtmpfs", "overlay", "squashfs", "proc", "sysfs", "cgroup", "cgroup2")
+
+
+# Таблица монтирования на docker-хостах — сотни overlay-строк; перечитываем её только при изменении.
+# poll() на /proc/self/mounts отдаёт POLLPRI при любом mount/umount, где такого нет — TTL.
+MOUNTSFILE = "/proc/self/mounts"
+MOUNTSTTL = 60.0
+_MOUNTS: dict[str, Any] = {"parts": None, "ts": 0.0, "poller": None, "fd": None}
+_MOUNTSLOCK = threading.Lock()
+
+
+def _mounts_watch() -> None:
+    if _MOUNTS["fd"] is not None or not hasattr(select, "poll") or not os.path.exists(MOUNTSFILE):
+        return
+    try:
+        fd = os.open(MOUNTSFILE, os.O_RDONLY)
+    except OSError:
+        return
+    poller = select.poll()
+    poller.register(fd, select.POLLPRI)
+    _MOUNTS["fd"] = fd
+    _MOUNTS["poller"] = poller
+
+
+def _mounts_changed() -> bool:
+    poller = _MOUNTS["poller"]
+    if poller is None:
+        return time.monotonic() - _MOUNTS["ts"] > MOUNTSTTL
+    return any(ev & (select.POLLPRI | select.POLLERR) for _, ev in poller.poll(0))
+
+
+def list_disk_partitions() -> list[tuple[str, str]]:
+    with _MOUNTSLOCK:
+        if _MOUNTS["parts"] is None or _mounts_changed():
+            # Сначала подписка, потом чтение: изменение между ними не потеряется
+            _mounts_watch()
+            out = []
+            for p in psutil.disk_partitions(all=False):
+                if p.fstype in SKIPFSTYPES:
+                    continue
+                out.append((p.device, p.mountpoint))
+            _MOUNTS["parts"] = out
+            _MOUNTS["ts"] = time.monotonic()
+        return list(_MOUNTS["parts"])
+
+
 def list_all_disks():
-    parts = psutil.disk_partitions(all=False)
     mountpoints, seen = [], set()
-    for p in parts:
-        mp = p.mountpoint
-        if p.fstype in ("tmpfs", "devtmpfs", "overlay", "squashfs", "proc", "sysfs", "cgroup", "cgroup2"):
-            continue
+    for _, mp in list_disk_partitions():
         anchor = Path(mp).anchor or mp
         key = anchor.lower()
         if key in seen:
@@ -502,32 +1477,312 @@ def list_all_disks():
     return mountpoints
 
 
-def tile_cpu():
-    cpu = psutil.cpu_percent(interval=0.2)
-    return {"id": "cpu", "title": AVAILABLETILES["cpu"], "value": f"{cpu:.0f}", "unit": "%", "sub": "Текущая нагрузка", "pct": max(0, min(100, int(cpu)))}
+# ---------------- Metrics sampler ----------------
+# Все блокирующие вызовы psutil выполняются в фоне, обработчики читают готовый снимок.
+SAMPLEINTERVAL = max(0.5, float(os.environ.get("SERVER_UI_SAMPLE_INTERVAL", "2")))
 
+METRICS: dict[str, Any] = {}
+_SAMPLERTASK: asyncio.Task | None = None
 
-def tile_ram():
-    mem = psutil.virtual_memory()
-    return {"id": "ram", "title": AVAILABLETILES["ram"], "value": fmt_gb(mem.used), "unit": "GB", "sub": f"из {fmt_gb(mem.total)} GB", "pct": int(mem.percent)}
+# Точка отсчёта для cpu_percent(interval=None): к первому снимку на старте накопится время импорта и initdb
+psutil.cpu_percent(interval=None)
 
+# Виртуальные интерфейсы (veth-пары docker-сетей, мосты) в сумму не входят — иначе трафик контейнеров считается дважды
+NETSKIP = ("lo", "veth", "docker", "br-", "virbr")
+_NETPREV: dict[str, Any] = {"ts": 0.0, "nics": {}}
 
-def tile_disk():
-    disks = list_all_disks()
-    lines = []
-    total_used = 0
-    total_all = 0
-    for mp in disks:
+
+def collect_net() -> dict[str, Any]:
+    now = time.monotonic()
+    counters = psutil.net_io_counters(pernic=True) or {}
+    prev = _NETPREV["nics"]
+    dt = now - _NETPREV["ts"] if _NETPREV["ts"] else 0.0
+
+    nics = []
+    cur = {}
+    tot = {"rx": 0, "tx": 0, "rx_rate": 0.0, "tx_rate": 0.0, "rx_pps": 0.0, "tx_pps": 0.0}
+    for name, c in counters.items():
+        vals = (c.bytes_recv, c.bytes_sent, c.packets_recv, c.packets_sent)
+        cur[name] = vals
+        if name.startswith(NETSKIP):
+            continue
+        p = prev.get(name)
+        if p and dt > 0:
+            # Счётчик уменьшился — интерфейс пересоздан, этот тик пропускаем
+            rates = [max(0, v - pv) / dt for v, pv in zip(vals, p)]
+        else:
+            rates = [0.0, 0.0, 0.0, 0.0]
+        nics.append({"name": name, "rx_rate": rates[0], "tx_rate": rates[1], "rx_pps": rates[2], "tx_pps": rates[3]})
+        tot["rx"] += vals[0]
+        tot["tx"] += vals[1]
+        tot["rx_rate"] += rates[0]
+        tot["tx_rate"] += rates[1]
+        tot["rx_pps"] += rates[2]
+        tot["tx_pps"] += rates[3]
+
+    _NETPREV["ts"] = now
+    _NETPREV["nics"] = cur
+    tot["nics"] = nics
+    return tot
+
+
+_DISKIOPREV: dict[str, Any] = {"ts": 0.0, "devs": {}}
+
+
+def _blockdevname(device: str) -> str:
+    # /dev/mapper/root -> dm-0: так устройство называется в /proc/diskstats
+    return os.path.basename(os.path.realpath(device)) if device.startswith("/dev/") else device
+
+
+def _ispartition(name: str) -> bool:
+    return os.path.exists(f"/sys/class/block/{name}/partition")
+
+
+def collect_diskio() -> dict[str, Any]:
+    now = time.monotonic()
+    try:
+        counters = psutil.disk_io_counters(perdisk=True) or {}
+    except Exception:
+        counters = {}
+    mounts: dict[str, str] = {}
+    for device, mp in list_disk_partitions():
+        mounts.setdefault(_blockdevname(device), mp)
+    names = [n for n in counters if n in mounts]
+    if not names:
+        # В контейнере разделы хоста не видны — показываем целые диски
+        names = [n for n in counters if not n.startswith(("loop", "ram", "zram")) and not _ispartition(n)]
+
+    prev = _DISKIOPREV["devs"]
+    dt = now - _DISKIOPREV["ts"] if _DISKIOPREV["ts"] else 0.0
+    cur = {}
+    devices = []
+    tot = {"read_rate": 0.0, "write_rate": 0.0, "read_iops": 0.0, "write_iops": 0.0, "busy": 0.0}
+    for name in names:
+        c = counters[name]
+        vals = (c.read_bytes, c.write_bytes, c.read_count, c.write_count, getattr(c, "busy_time", 0))
+        cur[name] = vals
+        p = prev.get(name)
+        if p and dt > 0:
+            rates = [max(0, v - pv) / dt for v, pv in zip(vals, p)]
+        else:
+            rates = [0.0] * 5
+        # busy_time в миллисекундах
+        busy = min(100.0, rates[4] / 10.0)
+        devices.append(
+            {
+                "name": name,
+                "mount": mounts.get(name),
+                "read_rate": rates[0],
+                "write_rate": rates[1],
+                "read_iops": rates[2],
+                "write_iops": rates[3],
+                "busy": busy,
+            }
+        )
+        tot["read_rate"] += rates[0]
+        tot["write_rate"] += rates[1]
+        tot["read_iops"] += rates[2]
+        tot["write_iops"] += rates[3]
+        tot["busy"] = max(tot["busy"], busy)
+
+    _DISKIOPREV["ts"] = now
+    _DISKIOPREV["devs"] = cur
+    tot["devices"] = devices
+    return tot
+
+
+def collect_metrics() -> dict[str, Any]:
+    mem = psutil.virtual_memory()
+    disks = []
+    for mp in list_all_disks():
         try:
             du = psutil.disk_usage(mp)
         except Exception:
             continue
-        used = int(du.used)
-        tot = int(du.total)
-        pct = int(du.percent)
+        disks.append({"mount": mp, "used": int(du.used), "total": int(du.total), "pct": int(du.percent)})
+    return {
+        "ts": time.time(),
+        # interval=None — не блокирует, считает нагрузку с момента предыдущего вызова
+        "cpu": float(psutil.cpu_percent(interval=None)),
+        "ram": {"used": int(mem.used), "total": int(mem.total), "pct": float(mem.percent)},
+        "disks": disks,
+        "temp": get_cpu_temp_c(),
+        "uptime": int(time.time() - psutil.boot_time()),
+        "net": collect_net(),
+        "diskio": collect_diskio(),
+    }
+
+
+def sample_metrics() -> dict[str, Any]:
+    global METRICS
+    METRICS = collect_metrics()
+    return METRICS
+
+
+async def metrics_sampler():
+    while True:
+        await asyncio.sleep(SAMPLEINTERVAL)
+        try:
+            m = await runio(sample_metrics)
+            record_history(m)
+            publishtiles()
+        except Exception:
+            pass
+
+
+# ---------------- Metrics history ----------------
+# Кольцевые буферы фиксированного размера: память не растёт, сколько бы процесс ни работал.
+HISTORYHOURS = max(1, int(os.environ.get("SERVER_UI_HISTORY_HOURS", "24")))
+HISTORYTIERS = (
+    (max(1, int(SAMPLEINTERVAL)), 3600),
+    (60, HISTORYHOURS * 3600),
+    (3600, 30 * 86400),
+)
+
+
+class MetricRing:
+    """Одна метрика в нескольких разрешениях; каждый бакет хранит min/max/sum/count."""
+
+    def __init__(self, tiers=HISTORYTIERS):
+        self.tiers = []
+        for step, span in tiers:
+            size = max(1, span // step)
+            self.tiers.append(
+                {
+                    "step": step,
+                    "size": size,
+                    "ids": array("q", [-1]) * size,
+                    "min": array("d", [0.0]) * size,
+                    "max": array("d", [0.0]) * size,
+                    "sum": array("d", [0.0]) * size,
+                    "cnt": array("I", [0]) * size,
+                }
+            )
+
+    def add(self, ts: float, value: float) -> None:
+        for t in self.tiers:
+            bucket = int(ts // t["step"])
+            i = bucket % t["size"]
+            if t["ids"][i] != bucket:
+                t["ids"][i] = bucket
+                t["min"][i] = t["max"][i] = t["sum"][i] = value
+                t["cnt"][i] = 1
+            else:
+                if value < t["min"][i]:
+                    t["min"][i] = value
+                if value > t["max"][i]:
+                    t["max"][i] = value
+                t["sum"][i] += value
+                t["cnt"][i] += 1
+
+    def query(self, seconds: int, step: int | None = None, now: float | None = None) -> tuple[int, list[list[float]]]:
+        now = time.time() if now is None else now
+        tier = self.tiers[-1]
+        for t in self.tiers:
+            if t["step"] * t["size"] >= seconds:
+                tier = t
+                break
+        base = tier["step"]
+        step = base if not step or step < base else (step // base) * base
+        ratio = step // base
+
+        last = int(now // base)
+        first = max(last - tier["size"] + 1, int((now - seconds) // base))
+        points: list[list[float]] = []
+        acc = None
+        for bucket in range(first, last + 1):
+            i = bucket % tier["size"]
+            group = bucket // ratio
+            if acc is not None and acc[0] != group:
+                points.append([acc[0] * step, round(acc[1], 2), round(acc[3] / acc[4], 2), round(acc[2], 2)])
+                acc = None
+            if tier["ids"][i] != bucket:
+                continue
+            if acc is None:
+                acc = [group, tier["min"][i], tier["max"][i], tier["sum"][i], tier["cnt"][i]]
+            else:
+                acc[1] = min(acc[1], tier["min"][i])
+                acc[2] = max(acc[2], tier["max"][i])
+                acc[3] += tier["sum"][i]
+                acc[4] += tier["cnt"][i]
+        if acc is not None:
+            points.append([acc[0] * step, round(acc[1], 2), round(acc[3] / acc[4], 2), round(acc[2], 2)])
+        return step, points
+
+
+HISTORYMETRICS = {
+    "cpu": lambda m: m.get("cpu"),
+    "ram": lambda m: (m.get("ram") or {}).get("pct"),
+    "disk": lambda m: _disks_pct(m.get("disks") or []),
+    "temp": lambda m: m.get("temp"),
+    "net_rx": lambda m: (m.get("net") or {}).get("rx_rate"),
+    "net_tx": lambda m: (m.get("net") or {}).get("tx_rate"),
+    "disk_read": lambda m: (m.get("diskio") or {}).get("read_rate"),
+    "disk_write": lambda m: (m.get("diskio") or {}).get("write_rate"),
+    "disk_iops": lambda m: _diskio_iops(m.get("diskio") or {}),
+    "disk_busy": lambda m: (m.get("diskio") or {}).get("busy"),
+}
+HISTORY: dict[str, MetricRing] = {}
+
+
+def _disks_pct(disks: list[dict]) -> float | None:
+    total = sum(d["total"] for d in disks)
+    if total <= 0:
+        return None
+    return sum(d["used"] for d in disks) * 100.0 / total
+
+
+def _diskio_iops(io: dict) -> float | None:
+    if "read_iops" not in io:
+        return None
+    return io["read_iops"] + io["write_iops"]
+
+
+def record_history(m: dict) -> None:
+    ts = m.get("ts")
+    if not ts:
+        return
+    for name, getter in HISTORYMETRICS.items():
+        v = getter(m)
+        if v is None:
+            continue
+        ring = HISTORY.get(name)
+        if ring is None:
+            ring = HISTORY[name] = MetricRing()
+        ring.add(ts, float(v))
+
+
+def parse_duration(text: str) -> int | None:
+    text = (text or "").strip().lower()
+    mult = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+    try:
+        if text and text[-1] in mult:
+            return int(float(text[:-1]) * mult[text[-1]])
+        return int(text)
+    except ValueError:
+        return None
+
+
+def tile_cpu(m: dict):
+    cpu = m.get("cpu", 0.0)
+    return {"id": "cpu", "title": AVAILABLETILES["cpu"], "value": f"{cpu:.0f}", "unit": "%", "sub": "Текущая нагрузка", "pct": max(0, min(100, int(cpu)))}
+
+
+def tile_ram(m: dict):
+    mem = m.get("ram") or {"used": 0, "total": 0, "pct": 0}
+    return {"id": "ram", "title": AVAILABLETILES["ram"], "value": fmt_gb(mem["used"]), "unit": "GB", "sub": f"из {fmt_gb(mem['total'])} GB", "pct": int(mem["pct"])}
+
+
+def tile_disk(m: dict):
+    lines = []
+    total_used = 0
+    total_all = 0
+    for d in m.get("disks") or []:
+        used = d["used"]
+        tot = d["total"]
         total_used += used
         total_all += tot
-        lines.append({"label": mp, "used_gb": fmt_gb(used), "total_gb": fmt_gb(tot), "pct": pct})
+        lines.append({"label": d["mount"], "used_gb": fmt_gb(used), "total_gb": fmt_gb(tot), "pct": d["pct"]})
 
     if total_all > 0:
         overall_pct = int((total_used / total_all) * 100)
@@ -541,50 +1796,165 @@ def tile_disk():
     return {"id": "disk", "title": AVAILABLETILES["disk"], "value": value, "unit": "GB", "sub": sub, "pct": max(0, min(100, overall_pct)), "lines": lines}
 
 
-def tile_temp():
-    temp_c = get_cpu_temp_c()
+def tile_temp(m: dict):
+    temp_c = m.get("temp")
     return {"id": "temp", "title": AVAILABLETILES["temp"], "value": "N/A" if temp_c is None else f"{temp_c:.0f}", "unit": "°C", "sub": "По данным ОС", "pct": None}
 
 
-def tile_uptime():
-    uptime_sec = int(time.time() - psutil.boot_time())
-    return {"id": "uptime", "title": AVAILABLETILES["uptime"], "value": fmt_duration(uptime_sec), "unit": "", "sub": "С момента запуска", "pct": None}
+def tile_uptime(m: dict):
+    return {"id": "uptime", "title": AVAILABLETILES["uptime"], "value": fmt_duration(m.get("uptime", 0)), "unit": "", "sub": "С момента запуска", "pct": None}
+
+
+def tile_net(m: dict):
+    net = m.get("net") or {}
+    rx = net.get("rx_rate", 0.0)
+    tx = net.get("tx_rate", 0.0)
+    lines = [
+        {
+            "label": n["name"],
+            "rx": f"{fmt_bytes(n['rx_rate'])}/с",
+            "tx": f"{fmt_bytes(n['tx_rate'])}/с",
+            "rx_pps": int(n["rx_pps"]),
+            "tx_pps": int(n["tx_pps"]),
+        }
+        for n in net.get("nics") or []
+    ]
+    return {
+        "id": "net",
+        "title": AVAILABLETILES["net"],
+        "value": fmt_bytes(rx + tx),
+        "unit": "/с",
+        "sub": f"↓ {fmt_bytes(rx)}/с ↑ {fmt_bytes(tx)}/с • всего ↓ {fmt_bytes(net.get('rx', 0))} ↑ {fmt_bytes(net.get('tx', 0))}",
+        "pct": None,
+        "lines": lines,
+    }
 
 
-def tile_net():
-    net = psutil.net_io_counters(pernic=False)
-    return {"id": "net", "title": AVAILABLETILES["net"], "value": "Трафик", "unit": "", "sub": f"↓ {fmt_bytes(net.bytes_recv)} ↑ {fmt_bytes(net.bytes_sent)}", "pct": None}
+def tile_diskio(m: dict):
+    io = m.get("diskio") or {}
+    rd = io.get("read_rate", 0.0)
+    wr = io.get("write_rate", 0.0)
+    iops = _diskio_iops(io) or 0.0
+    lines = [
+        {
+            "label": d["name"] if not d["mount"] else f"{d['name']} ({d['mount']})",
+            "read": f"{fmt_bytes(d['read_rate'])}/с",
+            "write": f"{fmt_bytes(d['write_rate'])}/с",
+            "iops": int(d["read_iops"] + d["write_iops"]),
+            "pct": int(d["busy"]),
+        }
+        for d in io.get("devices") or []
+    ]
+    return {
+        "id": "diskio",
+        "title": AVAILABLETILES["diskio"],
+        "value": fmt_bytes(rd + wr),
+        "unit": "/с",
+        "sub": f"R {fmt_bytes(rd)}/с W {fmt_bytes(wr)}/с • {iops:.0f} IOPS",
+        "pct": max(0, min(100, int(io.get("busy", 0)))),
+        "lines": lines,
+    }
 
 
-TILE_BUILDERS = {"cpu": tile_cpu, "ram": tile_ram, "disk": tile_disk, "temp": tile_temp, "uptime": tile_uptime, "net": tile_net}
+def tile_containers(m: dict):
+    stats = list(CSTATS.values())
+    cpu = sum(s["cpu"] or 0.0 for s in stats)
+    mem = sum(s["mem"] or 0 for s in stats)
+    top = max(stats, key=lambda s: s["cpu"] or 0.0, default=None)
+    sub = f"{len(stats)} запущено • RAM {fmt_bytes(mem)}"
+    if top and top["cpu"]:
+        sub += f" • больше всех {top['name']} {top['cpu']:.0f}%"
+    lines = [
+        {"label": s["name"], "cpu": f"{s['cpu'] or 0:.1f}%", "mem": fmt_bytes(s["mem"] or 0)}
+        for s in sorted(stats, key=lambda s: -(s["cpu"] or 0.0))
+    ]
+    return {"id": "containers", "title": AVAILABLETILES["containers"], "value": f"{cpu:.0f}", "unit": "%", "sub": sub, "pct": None, "lines": lines}
+
+
+TILE_BUILDERS = {
+    "cpu": tile_cpu,
+    "ram": tile_ram,
+    "disk": tile_disk,
+    "temp": tile_temp,
+    "uptime": tile_uptime,
+    "net": tile_net,
+    "diskio": tile_diskio,
+    "containers": tile_containers,
+}
 
 
 def build_tiles_for_widgets(widgets: list[str]) -> list[dict]:
+    m = METRICS
     tiles = []
     for wid in widgets:
         fn = TILE_BUILDERS.get(wid)
         if fn:
-            tiles.append(fn())
+            tiles.append(fn(m))
     return tiles
 
 
 # ---------------- Docker layer ----------------
-def dockerclient():
-    try:
-        return docker.from_env()
-    except DockerException:
-        return None
+# Один клиент на процесс: from_env() каждый раз создаёт пул соединений и делает запрос /version.
+# Ошибки соединения (не ответы API) сбрасывают клиента — следующий вызов переподключится.
+DOCKERERRORS = (DockerException, RequestException)
+DOCKERPINGTTL = 10.0
+_DOCKER: dict[str, Any] = {"client": None, "present": None, "checked": 0.0, "failedat": 0.0}
+_DOCKERLOCK = threading.Lock()
+
+
+class PullError(DockerException):
+    """Ошибка registry внутри потока pull (нет тега, нет доступа) — демон ответил, соединение живо."""
+
+
+def dockerclient():
+    with _DOCKERLOCK:
+        client = _DOCKER["client"]
+        if client is None:
+            # Демон недоступен — не долбим сокет на каждый запрос
+            if time.monotonic() - _DOCKER["failedat"] < DOCKERPINGTTL:
+                return None
+            try:
+                client = docker.from_env()
+            except DockerException:
+                _DOCKER["failedat"] = time.monotonic()
+                return None
+            _DOCKER["client"] = client
+        return client
+
+
+def dockerreset() -> None:
+    with _DOCKERLOCK:
+        client = _DOCKER["client"]
+        _DOCKER["client"] = None
+        _DOCKER["present"] = None
+        _DOCKER["failedat"] = 0.0
+    if client is not None:
+        try:
+            client.close()
+        except Exception:
+            pass
+
+
+def dockerfailed(e: Exception) -> None:
+    if not isinstance(e, (APIError, PullError)):
+        dockerreset()
 
 
 def dockerpresent() -> bool:
+    now = time.monotonic()
+    if _DOCKER["present"] is not None and now - _DOCKER["checked"] < DOCKERPINGTTL:
+        return _DOCKER["present"]
+    present = False
     c = dockerclient()
-    if not c:
-        return False
-    try:
-        c.ping()
-        return True
-    except DockerException:
-        return False
+    if c:
+        try:
+            c.ping()
+            present = True
+        except DOCKERERRORS as e:
+            dockerfailed(e)
+    _DOCKER["present"] = present
+    _DOCKER["checked"] = now
+    return present
 
 
 def appdir(appid: str) -> Path:
@@ -621,40 +1991,698 @@ def ensuredirsforservice(appid: str, servicespec: dict) -> dict:
 
 
 def findcontainers(client: docker.DockerClient, appid: str):
-    # Важно: all=True, чтобы stopped-контейнеры не “пропадали”
-    return client.containers.list(all=True, filters={"label": [f"serverui.app={appid}", "serverui.managed=true"]})
+    # Важно: all=True, чтобы stopped-контейнеры не “пропадали”.
+    # sparse=True — без отдельного inspect на каждый контейнер
+    return client.containers.list(all=True, sparse=True, filters={"label": [f"serverui.app={appid}", "serverui.managed=true"]})
+
+
+def containerrow(c) -> dict[str, Any]:
+    # attrs из /containers/json: Names/State/Image уже там, c.image не трогаем (это ещё один запрос)
+    a = c.attrs
+    names = a.get("Names") or []
+    return {
+        "name": names[0].lstrip("/") if names else c.short_id,
+        "status": a.get("State") if isinstance(a.get("State"), str) else c.status,
+        "image": a.get("Image") or "",
+        "health": _healthfromstatus(a.get("Status") or ""),
+    }
+
+
+def _healthfromstatus(text: str) -> str | None:
+    # "Up 2 hours (healthy)" / "Up 5 seconds (health: starting)"
+    for h in ("unhealthy", "healthy", "starting"):
+        if f"({h})" in text or f"(health: {h})" in text:
+            return h
+    return None
+
+
+def statusfromrows(rows: list[dict]) -> dict:
+    return {"ok": True, "containers": rows, "running": any(r["status"] == "running" for r in rows)}
 
 
 def appstatus(appid: str) -> dict:
+    cached = cachedappstatus(appid)
+    if cached is not None:
+        return cached
     client = dockerclient()
     if not client:
         return {"ok": False, "error": "Docker недоступен"}
     try:
-        containers = findcontainers(client, appid)
-        rows = []
-        running = False
-        for c in containers:
-            rows.append({"name": c.name, "status": c.status, "image": (c.image.tags[0] if c.image.tags else c.image.short_id)})
-            if c.status == "running":
-                running = True
-        return {"ok": True, "containers": rows, "running": running}
-    except DockerException as e:
+        return statusfromrows([containerrow(c) for c in findcontainers(client, appid)])
+    except DOCKERERRORS as e:
+        dockerfailed(e)
         return {"ok": False, "error": str(e)}
 
 
-def installapp(appid: str) -> tuple[bool, str]:
+def appsstatus() -> dict[str, dict]:
+    """Статус всех приложений каталога одним запросом к Docker (или из кэша событий)."""
+    cached = cachedappsstatus()
+    if cached is not None:
+        return cached
+    client = dockerclient()
+    if not client:
+        return {appid: {"ok": False, "error": "Docker недоступен"} for appid in APPCATALOG}
+    try:
+        containers = client.containers.list(all=True, sparse=True, filters={"label": "serverui.managed=true"})
+    except DOCKERERRORS as e:
+        dockerfailed(e)
+        return {appid: {"ok": False, "error": str(e)} for appid in APPCATALOG}
+    grouped: dict[str, list[dict]] = {appid: [] for appid in APPCATALOG}
+    for c in containers:
+        appid = (c.attrs.get("Labels") or {}).get("serverui.app")
+        if appid in grouped:
+            grouped[appid].append(containerrow(c))
+    return {appid: statusfromrows(rows) for appid, rows in grouped.items()}
+
+
+# ---------------- Container state cache (docker events) ----------------
+# Фоновый поток читает /events (только serverui.managed=true) и держит индекс appid -> id -> контейнер.
+# Поток событий открывается окнами по DOCKERRESYNC секунд; между окнами — полная пересверка одним list.
+DOCKERRESYNC = 60.0
+DOCKEREVENTSTATUS = {
+    "create": "created",
+    "start": "running",
+    "restart": "running",
+    "unpause": "running",
+    "pause": "paused",
+    "die": "exited",
+    "stop": "exited",
+}
+
+_CSTATE: dict[str, Any] = {"synced": False, "apps": {}}
+_CSTATELOCK = threading.Lock()
+_CSTOP = threading.Event()
+_CSTREAM: dict[str, Any] = {"stream": None, "thread": None}
+
+
+def _rowsfor(conts: dict[str, dict]) -> list[dict]:
+    return sorted((dict(r) for r in conts.values()), key=lambda r: r["name"])
+
+
+def cachedappstatus(appid: str) -> dict | None:
+    with _CSTATELOCK:
+        if not _CSTATE["synced"]:
+            return None
+        return statusfromrows(_rowsfor(_CSTATE["apps"].get(appid) or {}))
+
+
+def cachedappsstatus() -> dict[str, dict] | None:
+    with _CSTATELOCK:
+        if not _CSTATE["synced"]:
+            return None
+        return {appid: statusfromrows(_rowsfor(_CSTATE["apps"].get(appid) or {})) for appid in APPCATALOG}
+
+
+def _publishapps(appids) -> None:
+    statuses = cachedappsstatus() or {}
+    for appid in appids:
+        if appid in statuses:
+            publish("app", appsummary(appid, statuses[appid]))
+
+
+def containerstate_resync(client: docker.DockerClient) -> None:
+    containers = client.containers.list(all=True, sparse=True, filters={"label": "serverui.managed=true"})
+    index: dict[str, dict[str, dict]] = {}
+    for c in containers:
+        appid = (c.attrs.get("Labels") or {}).get("serverui.app")
+        if appid:
+            index.setdefault(appid, {})[c.id] = containerrow(c)
+    with _CSTATELOCK:
+        old = _CSTATE["apps"]
+        _CSTATE["apps"] = index
+        _CSTATE["synced"] = True
+    changed = [a for a in set(old) | set(index) if old.get(a) != index.get(a)]
+    _publishapps(changed)
+
+
+def containerstate_apply(ev: dict) -> None:
+    if ev.get("Type") != "container":
+        return
+    actor = ev.get("Actor") or {}
+    attrs = actor.get("Attributes") or {}
+    cid = actor.get("ID") or ev.get("id")
+    appid = attrs.get("serverui.app")
+    action = str(ev.get("Action") or ev.get("status") or "")
+    if not cid or not appid:
+        return
+    with _CSTATELOCK:
+        if not _CSTATE["synced"]:
+            return
+        conts = _CSTATE["apps"].setdefault(appid, {})
+        row = conts.get(cid)
+        if action == "destroy":
+            conts.pop(cid, None)
+        else:
+            if row is None:
+                row = conts[cid] = {"name": attrs.get("name") or cid[:12], "status": "created", "image": attrs.get("image") or "", "health": None}
+            if action in DOCKEREVENTSTATUS:
+                row["status"] = DOCKEREVENTSTATUS[action]
+            elif action.startswith("health_status"):
+                row["health"] = action.split(":", 1)[-1].strip()
+            elif action == "rename" and attrs.get("name"):
+                row["name"] = attrs["name"]
+            else:
+                return
+    _publishapps([appid])
+
+
+def dockerevents_loop() -> None:
+    while not _CSTOP.is_set():
+        client = dockerclient()
+        if not client:
+            _CSTOP.wait(DOCKERPINGTTL)
+            continue
+        try:
+            # since — момент до полной пересверки: события, случившиеся во время list, не теряются
+            since = time.time()
+            containerstate_resync(client)
+            while not _CSTOP.is_set():
+                until = since + DOCKERRESYNC
+                stream = client.events(
+                    since=since,
+                    until=until,
+                    decode=True,
+                    filters={"type": "container", "label": "serverui.managed=true"},
+                )
+                _CSTREAM["stream"] = stream
+                for ev in stream:
+                    containerstate_apply(ev)
+                _CSTREAM["stream"] = None
+                since = until
+                containerstate_resync(client)
+        except DOCKERERRORS as e:
+            dockerfailed(e)
+        except Exception:
+            pass
+        with _CSTATELOCK:
+            _CSTATE["synced"] = False
+        _CSTOP.wait(2)
+
+
+def containerstate_start() -> None:
+    _CSTOP.clear()
+    t = threading.Thread(target=dockerevents_loop, name="docker-events", daemon=True)
+    _CSTREAM["thread"] = t
+    t.start()
+
+
+def containerstate_stop() -> None:
+    _CSTOP.set()
+    stream = _CSTREAM["stream"]
+    if stream is not None:
+        try:
+            stream.close()
+        except Exception:
+            pass
+
+
+# ---------------- Container stats ----------------
+# CPU/RAM/диск читаются прямо из файлов cgroup v2 контейнера — это микросекунды против 1–2 с на
+# container.stats(stream=False). Если cgroup не видна (v1, другой драйвер, не смонтирована) — берём
+# поток /containers/{id}/stats, по одному потоку на контейнер. Сеть в cgroup нет: /proc/<pid>/net/dev,
+# а если pid из другого pid-namespace (мы сами в контейнере) — one-shot stats без ожидания второго замера.
+CGROUPROOT = Path(os.environ.get("SERVER_UI_CGROUP_ROOT", "/sys/fs/cgroup"))
+CGROUPDIRS = ("system.slice/docker-{id}.scope", "docker/{id}", "system.slice/docker/{id}")
+CSTATSINTERVAL = max(1, int(os.environ.get("SERVER_UI_CONTAINER_STATS_INTERVAL", "5")))
+CSTATSTIERS = (
+    (CSTATSINTERVAL, 3600),
+    (60, HISTORYHOURS * 3600),
+    (3600, 7 * 86400),
+)
+CSTATSMETRICS = ("cpu", "mem", "net_rx", "net_tx", "disk_read", "disk_write")
+
+CSTATS: dict[str, dict[str, Any]] = {}
+CSTATSHISTORY: dict[tuple[str, str], MetricRing] = {}
+_CSPREV: dict[str, dict[str, Any]] = {}
+_CSPATHS: dict[str, Path | None] = {}
+_CSSTREAMS: dict[str, dict[str, Any]] = {}
+_CSSTOP = threading.Event()
+
+
+def _readint(path: Path) -> int | None:
+    try:
+        text = path.read_text().strip()
+    except OSError:
+        return None
+    return int(text) if text.isdigit() else None
+
+
+def _readkv(path: Path) -> dict[str, int]:
+    out = {}
+    try:
+        for line in path.read_text().splitlines():
+            k, _, v = line.partition(" ")
+            if v.isdigit():
+                out[k] = int(v)
+    except OSError:
+        pass
+    return out
+
+
+def cgroupdir(cid: str) -> Path | None:
+    if cid in _CSPATHS:
+        return _CSPATHS[cid]
+    found = None
+    if (CGROUPROOT / "cgroup.controllers").exists():
+        for tpl in CGROUPDIRS:
+            d = CGROUPROOT / tpl.format(id=cid)
+            if (d / "cpu.stat").exists():
+                found = d
+                break
+    _CSPATHS[cid] = found
+    return found
+
+
+def _procnet(pid: int) -> tuple[int, int] | None:
+    try:
+        lines = Path(f"/proc/{pid}/net/dev").read_text().splitlines()[2:]
+    except OSError:
+        return None
+    rx = tx = 0
+    for line in lines:
+        name, _, rest = line.partition(":")
+        if name.strip() == "lo":
+            continue
+        cols = rest.split()
+        rx += int(cols[0])
+        tx += int(cols[8])
+    return rx, tx
+
+
+def cgroupraw(d: Path) -> dict[str, Any] | None:
+    """Накопительные счётчики контейнера из cgroup v2; None — контейнер уже исчез."""
+    usec = _readkv(d / "cpu.stat").get("usage_usec")
+    mem = _readint(d / "memory.current")
+    if usec is None or mem is None:
+        return None
+    # Как docker stats: страничный кэш, который можно вытеснить, в занятую память не входит
+    mem -= _readkv(d / "memory.stat").get("inactive_file", 0)
+    rd = wr = 0
+    try:
+        for line in (d / "io.stat").read_text().splitlines():
+            for field in line.split()[1:]:
+                k, _, v = field.partition("=")
+                if k == "rbytes":
+                    rd += int(v)
+                elif k == "wbytes":
+                    wr += int(v)
+    except OSError:
+        pass
+    raw = {"ts": time.monotonic(), "cpu": usec / 1e6, "mem": max(0, mem), "limit": _readint(d / "memory.max"), "rd": rd, "wr": wr, "rx": None, "tx": None}
+    try:
+        pid = int((d / "cgroup.procs").read_text().split()[0])
+    except (OSError, IndexError, ValueError):
+        pid = None
+    net = _procnet(pid) if pid else None
+    if net:
+        raw["rx"], raw["tx"] = net
+    return raw
+
+
+def dockerraw(s: dict) -> dict[str, Any] | None:
+    cpu = ((s.get("cpu_stats") or {}).get("cpu_usage") or {}).get("total_usage")
+    if cpu is None:
+        return None
+    ms = s.get("memory_stats") or {}
+    extra = ms.get("stats") or {}
+    mem = ms.get("usage")
+    if mem is not None:
+        mem -= extra.get("inactive_file", extra.get("total_inactive_file", 0))
+    nets = (s.get("networks") or {}).values()
+    rd = wr = 0
+    for e in (s.get("blkio_stats") or {}).get("io_service_bytes_recursive") or []:
+        op = str(e.get("op", "")).lower()
+        if op == "read":
+            rd += e.get("value", 0)
+        elif op == "write":
+            wr += e.get("value", 0)
+    return {
+        "ts": time.monotonic(),
+        "cpu": cpu / 1e9,
+        "mem": max(0, mem) if mem is not None else None,
+        "limit": ms.get("limit"),
+        "rd": rd,
+        "wr": wr,
+        "rx": sum(n.get("rx_bytes", 0) for n in nets) if nets else None,
+        "tx": sum(n.get("tx_bytes", 0) for n in nets) if nets else None,
+    }
+
+
+def _statsstream(cid: str) -> None:
+    entry = _CSSTREAMS[cid]
+    try:
+        client = dockerclient()
+        if client:
+            for s in client.api.stats(cid, stream=True, decode=True):
+                if _CSSTOP.is_set() or entry["stop"]:
+                    break
+                entry["raw"] = dockerraw(s)
+    except Exception:
+        pass
+    _CSSTREAMS.pop(cid, None)
+
+
+def _streamraw(cid: str) -> dict[str, Any] | None:
+    entry = _CSSTREAMS.get(cid)
+    if entry is None:
+        entry = _CSSTREAMS[cid] = {"raw": None, "stop": False}
+        threading.Thread(target=_statsstream, args=(cid,), name=f"stats-{cid[:12]}", daemon=True).start()
+    return entry["raw"]
+
+
+def _oneshotnet(client, cid: str) -> tuple[int, int] | None:
+    try:
+        s = client.api.stats(cid, stream=False, one_shot=True)
+    except Exception:
+        return None
+    nets = (s.get("networks") or {}).values()
+    if not nets:
+        return None
+    return sum(n.get("rx_bytes", 0) for n in nets), sum(n.get("tx_bytes", 0) for n in nets)
+
+
+def runningcontainers() -> dict[str, tuple[str, str]]:
+    """id -> (appid, имя) запущенных контейнеров; из кэша событий, без запроса к Docker."""
+    with _CSTATELOCK:
+        if _CSTATE["synced"]:
+            return {cid: (appid, row["name"]) for appid, conts in _CSTATE["apps"].items() for cid, row in conts.items() if row["status"] == "running"}
+    client = dockerclient()
+    if not client:
+        return {}
+    try:
+        conts = client.containers.list(sparse=True, filters={"label": "serverui.managed=true", "status": "running"})
+    except DOCKERERRORS as e:
+        dockerfailed(e)
+        return {}
+    out = {}
+    for c in conts:
+        appid = (c.attrs.get("Labels") or {}).get("serverui.app")
+        if appid:
+            out[c.id] = (appid, containerrow(c)["name"])
+    return out
+
+
+def _rate(cur: dict, prev: dict | None, key: str, dt: float) -> float | None:
+    if prev is None or cur.get(key) is None or prev.get(key) is None or dt <= 0:
+        return None
+    return max(0, cur[key] - prev[key]) / dt
+
+
+def sample_containers() -> None:
+    running = runningcontainers()
+    client = None
+    stats: dict[str, dict[str, Any]] = {}
+    for cid, (appid, name) in running.items():
+        d = cgroupdir(cid)
+        raw = cgroupraw(d) if d else None
+        source = "cgroup"
+        if raw is None:
+            raw = _streamraw(cid)
+            source = "docker"
+        elif raw["rx"] is None:
+            client = client or dockerclient()
+            net = _oneshotnet(client, cid) if client else None
+            if net:
+                raw["rx"], raw["tx"] = net
+        if raw is None:
+            continue
+        prev = _CSPREV.get(cid)
+        _CSPREV[cid] = raw
+        dt = raw["ts"] - prev["ts"] if prev else 0.0
+        cpu = _rate(raw, prev, "cpu", dt)
+        limit = raw["limit"] or psutil.virtual_memory().total
+        stats[cid] = {
+            "id": cid[:12],
+            "appid": appid,
+            "name": name,
+            "source": source,
+            "cpu": None if cpu is None else cpu * 100.0,
+            "mem": raw["mem"],
+            "mem_limit": limit,
+            "mem_pct": raw["mem"] * 100.0 / limit if raw["mem"] is not None and limit else None,
+            "net_rx": _rate(raw, prev, "rx", dt),
+            "net_tx": _rate(raw, prev, "tx", dt),
+            "disk_read": _rate(raw, prev, "rd", dt),
+            "disk_write": _rate(raw, prev, "wr", dt),
+        }
+
+    # Остановленные контейнеры: забываем прошлые замеры и путь, их потоки stats завершатся сами
+    for cid in set(_CSPREV) - set(running):
+        _CSPREV.pop(cid, None)
+    for cid in set(_CSPATHS) - set(running):
+        _CSPATHS.pop(cid, None)
+    for cid in set(_CSSTREAMS) - set(running):
+        entry = _CSSTREAMS.get(cid)
+        if entry:
+            entry["stop"] = True
+
+    global CSTATS
+    CSTATS = stats
+    now = time.time()
+    apps = {appid: appcontainerstats(appid) for appid in {s["appid"] for s in stats.values()}}
+    for appid, agg in apps.items():
+        for metric in CSTATSMETRICS:
+            v = agg[metric]
+            if v is None:
+                continue
+            ring = CSTATSHISTORY.get((appid, metric))
+            if ring is None:
+                ring = CSTATSHISTORY[(appid, metric)] = MetricRing(CSTATSTIERS)
+            ring.add(now, float(v))
+    publish("containerstats", apps)
+
+
+def appcontainerstats(appid: str) -> dict[str, Any]:
+    conts = sorted((s for s in CSTATS.values() if s["appid"] == appid), key=lambda s: s["name"])
+    agg: dict[str, Any] = {"containers": conts}
+    for metric in CSTATSMETRICS:
+        vals = [s[metric] for s in conts if s[metric] is not None]
+        agg[metric] = sum(vals) if vals else None
+    return agg
+
+
+def containerstats_loop() -> None:
+    while not _CSSTOP.wait(CSTATSINTERVAL):
+        try:
+            sample_containers()
+        except Exception:
+            pass
+
+
+def containerstats_start() -> None:
+    _CSSTOP.clear()
+    threading.Thread(target=containerstats_loop, name="container-stats", daemon=True).start()
+
+
+def containerstats_stop() -> None:
+    _CSSTOP.set()
+
+
+# ---------------- Image pulls ----------------
+# Образы сервисов тянутся параллельно (не больше PULLWORKERS), по потоковому API —
+# с побайтовым прогрессом по слоям, который уходит в задачу.
+PULLWORKERS = 3
+PULLDONE = ("Download complete", "Pull complete", "Already exists")
+
+
+def pullimage(client: docker.DockerClient, image: str, layers: dict, lock: threading.Lock, onupdate) -> None:
+    repo, tag = docker.utils.parse_repository_tag(image)
+    for ev in client.api.pull(repo, tag=tag or "latest", stream=True, decode=True):
+        if ev.get("error"):
+            raise PullError(ev["error"])
+        lid = ev.get("id")
+        status = ev.get("status") or ""
+        if not lid or lid == (tag or "latest"):
+            continue
+        with lock:
+            layer = layers.setdefault(lid, {"current": 0, "total": 0, "status": ""})
+            layer["status"] = status
+            detail = ev.get("progressDetail") or {}
+            if status == "Downloading" and detail.get("total"):
+                layer["current"] = int(detail.get("current") or 0)
+                layer["total"] = int(detail["total"])
+            elif status in PULLDONE and layer["total"]:
+                layer["current"] = layer["total"]
+        onupdate()
+
+
+def pullimages(client: docker.DockerClient, images: list[str], progress=None) -> None:
+    started = time.monotonic()
+    lock = threading.Lock()
+    state: dict[str, dict] = {img: {} for img in images}
+
+    def snapshot(final: bool = False) -> None:
+        if progress is None:
+            return
+        with lock:
+            out = {}
+            cur = tot = 0
+            for img, layers in state.items():
+                lcur = sum(l["current"] for l in layers.values())
+                ltot = sum(l["total"] for l in layers.values())
+                cur += lcur
+                tot += ltot
+                out[img] = {
+                    "current": lcur,
+                    "total": ltot,
+                    "layers": {
+                        lid: {**l, "pct": int(l["current"] * 100 / l["total"]) if l["total"] else (100 if l["status"] in PULLDONE else 0)}
+                        for lid, l in layers.items()
+                    },
+                }
+        elapsed = max(0.001, time.monotonic() - started)
+        rate = cur / elapsed
+        progress(
+            {
+                "phase": "pull",
+                "current": cur,
+                "total": tot,
+                "pct": int(cur * 100 / tot) if tot else 0,
+                "rate": int(rate),
+                "eta": int((tot - cur) / rate) if rate > 0 and tot > cur else None,
+                "images": out,
+            },
+            final,
+        )
+
+    with ThreadPoolExecutor(max_workers=min(PULLWORKERS, max(1, len(images))), thread_name_prefix="pull") as ex:
+        futures = [ex.submit(pullimage, client, img, state[img], lock, snapshot) for img in images]
+        for f in futures:
+            f.result()
+    snapshot(final=True)
+
+
+# ---------------- Image cache ----------------
+# Перед pull смотрим локальное хранилище образов и таблицу imagepulls (когда тянули, какой digest).
+# Политика на приложение: always — тянуть всегда, missing — только если образа нет,
+# stale — если нет или последний pull старше maxagehours. Устаревший образ сначала сверяем
+# с digest из registry (кэшируется на IMAGEDIGESTTTL): совпал — pull не нужен.
+PULLPOLICIES = ("always", "missing", "stale")
+PULLPOLICYDEFAULT = os.environ.get("SERVER_UI_PULL_POLICY", "stale")
+PULLMAXAGEHOURS = float(os.environ.get("SERVER_UI_PULL_MAX_AGE_HOURS", "24"))
+IMAGEREMOTECHECK = os.environ.get("SERVER_UI_IMAGE_REMOTE_CHECK", "1") != "0"
+IMAGEDIGESTTTL = 3600.0
+
+
+def _loadpullpolicy(appid: str) -> dict[str, Any]:
+    meta = APPCATALOG.get(appid) or {}
+    policy = meta.get("pull_policy") or PULLPOLICYDEFAULT
+    maxage = float(meta.get("pull_max_age_hours") or PULLMAXAGEHOURS)
+    with db() as conn:
+        row = conn.execute("SELECT policy, maxagehours FROM apppull WHERE appid=?", (appid,)).fetchone()
+    if row:
+        policy = row["policy"]
+        if row["maxagehours"] is not None:
+            maxage = float(row["maxagehours"])
+    return {"policy": policy if policy in PULLPOLICIES else "stale", "max_age_hours": maxage}
+
+
+def getpullpolicy(appid: str) -> dict[str, Any]:
+    return dict(cacheget(f"pullpolicy:{appid}", lambda: _loadpullpolicy(appid)))
+
+
+def setpullpolicy(appid: str, policy: str, maxagehours: float | None = None) -> dict[str, Any]:
+    policy = policy if policy in PULLPOLICIES else "stale"
+    if maxagehours is not None:
+        maxagehours = max(0.0, float(maxagehours))
+    with db() as conn:
+        conn.execute(
+            "INSERT INTO apppull(appid, policy, maxagehours, updatedat) VALUES(?, ?, ?, ?) "
+            "ON CONFLICT(appid) DO UPDATE SET policy=excluded.policy, maxagehours=excluded.maxagehours, updatedat=excluded.updatedat",
+            (appid, policy, maxagehours, datetime.utcnow().isoformat()),
+        )
+        version = configbump(conn)
+    cacheset(f"pullpolicy:{appid}", _loadpullpolicy(appid), version)
+    return getpullpolicy(appid)
+
+
+def _imagerow(image: str) -> dict | None:
+    with db() as conn:
+        row = conn.execute("SELECT * FROM imagepulls WHERE image=?", (image,)).fetchone()
+    return dict(row) if row else None
+
+
+def _localimage(client: docker.DockerClient, image: str) -> dict | None:
+    try:
+        return client.api.inspect_image(image)
+    except NotFound:
+        return None
+
+
+def _remotedigest(client: docker.DockerClient, image: str, row: dict | None) -> str | None:
+    now = time.time()
+    if row and row.get("remotedigest") and now - (row.get("checkedat") or 0) < IMAGEDIGESTTTL:
+        return row["remotedigest"]
+    try:
+        digest = (client.api.inspect_distribution(image).get("Descriptor") or {}).get("digest")
+    except DOCKERERRORS:
+        return None
+    with db() as conn:
+        conn.execute(
+            "INSERT INTO imagepulls(image, remotedigest, checkedat) VALUES(?, ?, ?) "
+            "ON CONFLICT(image) DO UPDATE SET remotedigest=excluded.remotedigest, checkedat=excluded.checkedat",
+            (image, digest, now),
+        )
+    return digest
+
+
+def recordpull(client: docker.DockerClient, image: str) -> None:
+    info = _localimage(client, image) or {}
+    digests = info.get("RepoDigests") or []
+    digest = digests[0].split("@", 1)[-1] if digests else None
+    with db() as conn:
+        conn.execute(
+            "INSERT INTO imagepulls(image, imageid, digest, pulledat) VALUES(?, ?, ?, ?) "
+            "ON CONFLICT(image) DO UPDATE SET imageid=excluded.imageid, digest=excluded.digest, pulledat=excluded.pulledat",
+            (image, info.get("Id"), digest, time.time()),
+        )
+
+
+def imagesneedpull(client: docker.DockerClient, images: list[str], policy: dict[str, Any]) -> list[str]:
+    if policy["policy"] == "always":
+        return list(images)
+    out = []
+    for image in images:
+        info = _localimage(client, image)
+        if info is None:
+            out.append(image)
+            continue
+        if policy["policy"] == "missing":
+            continue
+        row = _imagerow(image)
+        if row and row.get("pulledat") and time.time() - row["pulledat"] < policy["max_age_hours"] * 3600:
+            continue
+        if IMAGEREMOTECHECK:
+            remote = _remotedigest(client, image, row)
+            local = {d.split("@", 1)[-1] for d in info.get("RepoDigests") or []}
+            if remote and remote in local:
+                # Образ в registry не менялся — считаем его свежим, следующая сверка через maxage
+                recordpull(client, image)
+                continue
+            if remote is None:
+                # registry недоступен, а локальный образ есть — ставим из него
+                continue
+        out.append(image)
+    return out
+
+
+def installapp(appid: str, progress=None) -> tuple[bool, str]:
     meta = APPCATALOG.get(appid)
     if not meta:
         return False, "Неизвестное приложение"
     client = dockerclient()
     if not client:
-        return False, "Docker недоступен"
+        raise TransientJobError("Docker недоступен")
 
     try:
         net = ensurenetwork(client, appid)
         services = meta.get("services") or []
-        for svc in services:
-            client.images.pull(svc["image"])
+        images = list(dict.fromkeys(svc["image"] for svc in services))
+        topull = imagesneedpull(client, images, getpullpolicy(appid))
+        if topull:
+            pullimages(client, topull, progress)
+            for image in topull:
+                recordpull(client, image)
 
         for svc in services:
             svcname = svc["name"]
@@ -697,14 +2725,17 @@ def installapp(appid: str) -> tuple[bool, str]:
             c.start()
 
         return True, "OK"
-    except DockerException as e:
+    except DOCKERERRORS as e:
+        dockerfailed(e)
+        if _istransient(e):
+            raise TransientJobError(str(e)) from e
         return False, str(e)
 
 
 def actionapp(appid: str, action: str) -> tuple[bool, str]:
     client = dockerclient()
     if not client:
-        return False, "Docker недоступен"
+        raise TransientJobError("Docker недоступен")
     try:
         containers = findcontainers(client, appid)
 
@@ -734,10 +2765,367 @@ def actionapp(appid: str, action: str) -> tuple[bool, str]:
             return False, "Неизвестное действие"
 
         return True, "OK"
-    except DockerException as e:
+    except DOCKERERRORS as e:
+        dockerfailed(e)
+        if _istransient(e):
+            raise TransientJobError(str(e)) from e
         return False, str(e)
 
 
+# ---------------- Log archive ----------------
+# Логи управляемых контейнеров пишутся в сегменты LOGSDIR/<container>/<start>.log.
+# Закрытый сегмент сжимается в .log.gz, рядом .idx: диапазон времени и bloom-фильтр токенов.
+# Поиск пропускает сегменты, которые не пересекаются по времени или точно не содержат слов запроса.
+# Фильтр строится при закрытии сегмента под число его различных токенов (~1% ложных срабатываний),
+# размер и число хешей хранятся в .idx. Однобуквенные слова в фильтр не попадают: запрос только из
+# них не отсекает ни одного сегмента и сверяется построчно.
+LOGARCHIVE = os.environ.get("SERVER_UI_LOG_ARCHIVE", "1") != "0"
+LOGSEGMENTBYTES = 8 * 1024 * 1024
+LOGSEGMENTAGE = 3600.0
+LOGKEEPSEGMENTS = 48
+LOGINGESTTAIL = 1000
+LOGARCHIVECHECK = 15.0
+BLOOMBITSPERTOKEN = 10
+BLOOMHASHES = 7
+BLOOMMINBITS = 1 << 10
+
+_TOKENRE = re.compile(r"\w{2,}")
+_WORDRE = re.compile(r"\w+")
+_LOGINGEST: dict[str, dict[str, Any]] = {}
+_LOGSTOP = threading.Event()
+
+
+def logtokens(text: str) -> set[str]:
+    return set(_TOKENRE.findall(text.lower()))
+
+
+def _bloompositions(token: str, bits: int, hashes: int) -> list[int]:
+    d = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+    h1 = int.from_bytes(d[:4], "little")
+    h2 = int.from_bytes(d[4:], "little") | 1
+    return [(h1 + i * h2) % bits for i in range(hashes)]
+
+
+def bloombits(tokens: int) -> int:
+    bits = max(BLOOMMINBITS, tokens * BLOOMBITSPERTOKEN)
+    return (bits + 7) // 8 * 8
+
+
+def bloomadd(bloom: bytearray, token: str, bits: int, hashes: int) -> None:
+    for pos in _bloompositions(token, bits, hashes):
+        bloom[pos >> 3] |= 1 << (pos & 7)
+
+
+def bloomhas(bloom: bytes, token: str, bits: int, hashes: int) -> bool:
+    return all(bloom[pos >> 3] & (1 << (pos & 7)) for pos in _bloompositions(token, bits, hashes))
+
+
+def _logts(ts: str) -> float | None:
+    cur = _logcursor(ts)
+    return None if cur is None else cur[0] + cur[1] / 1e9
+
+
+class LogSegmentWriter:
+    """Дописывает строки контейнера в открытый сегмент и ротирует его по размеру/возрасту."""
+
+    def __init__(self, container: str):
+        self.dir = LOGSDIR / container
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.path: Path | None = None
+        self.fp = None
+        self.size = 0
+        self.openedat = 0.0
+        self.cursor: str | None = None
+        # write() идёт из потока приёма, sealidle() — из цикла архива
+        self.lock = threading.Lock()
+        opened = sorted(self.dir.glob("*.log"))
+        if opened:
+            # Открытый сегмент от прошлого запуска: продолжаем его и берём курсор из последней строки
+            self._open(opened[-1])
+            self.cursor = _lastlogts(opened[-1])
+        else:
+            # После ротации новый сегмент открывается только с первой строкой — курсор в индексе последнего
+            self.cursor = _lastsealedts(self.dir)
+
+    def _open(self, path: Path) -> None:
+        self.path = path
+        self.fp = open(path, "a", encoding="utf-8")
+        self.size = path.stat().st_size
+        self.openedat = time.monotonic()
+
+    def write(self, ts: str, text: str) -> None:
+        with self.lock:
+            if self.fp is None:
+                self._open(self.dir / f"{time.time_ns()}.log")
+            line = f"{ts} {text}\n"
+            self.fp.write(line)
+            self.size += len(line)
+            self.cursor = ts
+            if self.size >= LOGSEGMENTBYTES or time.monotonic() - self.openedat >= LOGSEGMENTAGE:
+                self._rotate()
+
+    def flush(self) -> None:
+        with self.lock:
+            if self.fp is not None:
+                self.fp.flush()
+
+    def sealidle(self) -> None:
+        """Закрыть сегмент по возрасту, даже если контейнер молчит и write() не вызывается."""
+        with self.lock:
+            if self.fp is not None and time.monotonic() - self.openedat >= LOGSEGMENTAGE:
+                self._rotate()
+
+    def _rotate(self) -> None:
+        if self.fp is None or self.path is None:
+            return
+        self.fp.close()
+        self.fp = None
+        sealsegment(self.path)
+        self.path = None
+        segs = sorted(self.dir.glob("*.log.gz"))
+        for old in segs[:-LOGKEEPSEGMENTS]:
+            old.unlink(missing_ok=True)
+            old.with_name(old.name[: -len(".log.gz")] + ".idx").unlink(missing_ok=True)
+
+    def close(self) -> None:
+        with self.lock:
+            if self.fp is not None:
+                self.fp.close()
+                self.fp = None
+
+
+def _lastlogts(path: Path) -> str | None:
+    try:
+        with open(path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            f.seek(max(0, f.tell() - 65536))
+            tail = f.read().splitlines()
+    except OSError:
+        return None
+    for raw in reversed(tail):
+        ts = raw.split(b" ", 1)[0].decode("utf-8", errors="replace")
+        if _logcursor(ts):
+            return ts
+    return None
+
+
+def _lastsealedts(folder: Path) -> str | None:
+    idxs = sorted(folder.glob("*.idx"))
+    if not idxs:
+        return None
+    try:
+        idx = json.loads(idxs[-1].read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    return idx.get("last")
+
+
+def sealsegment(path: Path) -> None:
+    """Сжать сегмент и записать индекс одним проходом по файлу."""
+    tokens: set[str] = set()
+    start = end = None
+    last = lastcur = None
+    lines = 0
+    gzpath = path.with_name(path.name + ".gz")
+    with open(path, "r", encoding="utf-8", errors="replace") as src, gzip.open(gzpath, "wt", encoding="utf-8") as dst:
+        for line in src:
+            dst.write(line)
+            ts, _, text = line.partition(" ")
+            cur = _logcursor(ts)
+            if cur is not None:
+                t = cur[0] + cur[1] / 1e9
+                start = t if start is None else min(start, t)
+                end = t if end is None else max(end, t)
+                if lastcur is None or cur > lastcur:
+                    # Исходная строка времени — курсор для продолжения после перезапуска, без потери наносекунд
+                    last, lastcur = ts, cur
+            tokens |= logtokens(text)
+            lines += 1
+    bits = bloombits(len(tokens))
+    bloom = bytearray(bits // 8)
+    for tok in tokens:
+        bloomadd(bloom, tok, bits, BLOOMHASHES)
+    idx = {"start": start, "end": end, "last": last, "lines": lines, "bits": bits, "hashes": BLOOMHASHES, "bloom": base64.b64encode(bytes(bloom)).decode("ascii")}
+    tmp = path.with_name(path.name[: -len(".log")] + ".idx.tmp")
+    tmp.write_text(json.dumps(idx), encoding="utf-8")
+    tmp.replace(path.with_name(path.name[: -len(".log")] + ".idx"))
+    path.unlink(missing_ok=True)
+
+
+def _logingest(container: str, state: dict) -> None:
+    writer = LogSegmentWriter(container)
+    state["writer"] = writer
+    stop = state["stop"]
+    lastflush = time.monotonic()
+
+    def emit(ts: str, text: str) -> bool:
+        nonlocal lastflush
+        writer.write(ts, text)
+        if time.monotonic() - lastflush > 1.0:
+            writer.flush()
+            lastflush = time.monotonic()
+        return not stop.is_set()
+
+    try:
+        _logfollow(container, writer.cursor, LOGINGESTTAIL, emit, stop, state)
+    except DOCKERERRORS as e:
+        if not stop.is_set():
+            dockerfailed(e)
+    finally:
+        writer.close()
+
+
+def logarchive_loop() -> None:
+    while not _LOGSTOP.wait(LOGARCHIVECHECK):
+        try:
+            statuses = appsstatus()
+        except Exception:
+            continue
+        wanted = {
+            c["name"]
+            for st in statuses.values()
+            if st.get("ok")
+            for c in st.get("containers") or []
+            if c.get("status") == "running"
+        }
+        for name, state in list(_LOGINGEST.items()):
+            if not state["thread"].is_alive() or name not in wanted:
+                _logingest_stop(name)
+            elif state.get("writer") is not None:
+                try:
+                    state["writer"].sealidle()
+                except OSError:
+                    pass
+        _sealorphans(set(_LOGINGEST) | wanted)
+        for name in wanted - set(_LOGINGEST):
+            state: dict[str, Any] = {"stop": threading.Event()}
+            t = threading.Thread(target=_logingest, args=(name, state), name=f"logs-{name}", daemon=True)
+            state["thread"] = t
+            _LOGINGEST[name] = state
+            t.start()
+
+
+def _sealorphans(active: set[str]) -> None:
+    """Сегменты остановленных контейнеров: приёма для них нет, закрываем по времени последней записи."""
+    if not LOGSDIR.is_dir():
+        return
+    now = time.time()
+    for d in LOGSDIR.iterdir():
+        if d.name in active or not d.is_dir():
+            continue
+        for p in d.glob("*.log"):
+            try:
+                if now - p.stat().st_mtime >= LOGSEGMENTAGE:
+                    sealsegment(p)
+            except OSError:
+                pass
+
+
+def _logingest_stop(name: str) -> None:
+    state = _LOGINGEST.pop(name, None)
+    if not state:
+        return
+    state["stop"].set()
+    stream = state.get("stream")
+    if stream is not None:
+        try:
+            stream.close()
+        except Exception:
+            pass
+
+
+def logarchive_start() -> None:
+    if not LOGARCHIVE:
+        return
+    _LOGSTOP.clear()
+    threading.Thread(target=logarchive_loop, name="logs-archive", daemon=True).start()
+
+
+def logarchive_stop() -> None:
+    _LOGSTOP.set()
+    for name in list(_LOGINGEST):
+        _logingest_stop(name)
+
+
+def searchlogs(containers: list[str], q: str, since: float | None, until: float | None, limit: int) -> dict[str, Any]:
+    """Слова запроса должны встретиться в строке целиком (без учёта регистра)."""
+    words = set(_WORDRE.findall(q.lower()))
+    # В bloom-фильтре только слова от двух символов; однобуквенные проверяются лишь построчно
+    tokens = {w for w in words if len(w) >= 2}
+    segments = []
+    for name in containers:
+        d = LOGSDIR / name
+        if not d.is_dir():
+            continue
+        for p in d.glob("*.log.gz"):
+            segments.append((int(p.name.split(".", 1)[0]), name, p, True))
+        for p in d.glob("*.log"):
+            segments.append((int(p.name.split(".", 1)[0]), name, p, False))
+    # Сначала свежие сегменты: при достижении limit старые не трогаем
+    segments.sort(reverse=True)
+
+    found: list[dict] = []
+    scanned = skipped = 0
+    for _, name, path, sealed in segments:
+        if len(found) >= limit:
+            break
+        if sealed:
+            try:
+                idx = json.loads(path.with_name(path.name[: -len(".log.gz")] + ".idx").read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                idx = None
+            if idx:
+                if idx.get("start") is not None and ((until is not None and idx["start"] > until) or (since is not None and idx["end"] < since)):
+                    skipped += 1
+                    continue
+                bloom = base64.b64decode(idx.get("bloom") or "")
+                bits, hashes = idx.get("bits"), idx.get("hashes")
+                usable = isinstance(bits, int) and isinstance(hashes, int) and 0 < bits <= len(bloom) * 8 and hashes > 0
+                if tokens and usable and not all(bloomhas(bloom, t, bits, hashes) for t in tokens):
+                    skipped += 1
+                    continue
+        scanned += 1
+        matches = []
+        opener = gzip.open if sealed else open
+        try:
+            with opener(path, "rt", encoding="utf-8", errors="replace") as f:
+                for line in f:
+                    ts, _, text = line.rstrip("\n").partition(" ")
+                    if since is not None or until is not None:
+                        t = _logts(ts)
+                        if t is None or (since is not None and t < since) or (until is not None and t > until):
+                            continue
+                    if words and not words <= set(_WORDRE.findall(text.lower())):
+                        continue
+                    matches.append({"container": name, "ts": ts, "text": text})
+        except (OSError, EOFError):
+            continue
+        found.extend(matches[-(limit - len(found)):])
+    found.sort(key=lambda m: _logcursor(m["ts"]) or (0, 0))
+    return {"lines": found, "scanned": scanned, "skipped": skipped, "truncated": len(found) >= limit}
+
+
+def parsetime(text: str | None) -> float | None:
+    """Эпоха в секундах, ISO-8601 или длительность назад от текущего момента (15m, 2h)."""
+    if not text:
+        return None
+    try:
+        return float(text)
+    except ValueError:
+        pass
+    if text[-1:].lower() in ("s", "m", "h", "d"):
+        d = parse_duration(text)
+        if d is not None:
+            return time.time() - d
+    try:
+        dt = datetime.fromisoformat(text.replace("Z", "+00:00"))
+    except ValueError:
+        raise ValueError(text)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
 # ---------------- Icons (no static icons folder needed) ----------------
 def _default_icon_svg(appid: str) -> str:
     letter = (appid[:1] or "A").upper()
@@ -779,22 +3167,29 @@ def iconurl(appid: str) -> str:
 
 @app.get("/icons/{appid}")
 async def getappicon(appid: str):
-    meta = geticonmeta(appid)
+    meta = await runio(geticonmeta, appid)
     if not meta:
         svg = _default_icon_svg(appid)
         return Response(content=svg, media_type="image/svg+xml")
 
     filename, mimetype = meta
     path = ICONSDIR / filename
-    if not path.exists():
+    if mimetype == "image/svg+xml":
+        svg = await runio(_readiconsvg, path)
+        return Response(content=svg if svg is not None else _default_icon_svg(appid), media_type="image/svg+xml")
+    if not await runio(path.exists):
         svg = _default_icon_svg(appid)
         return Response(content=svg, media_type="image/svg+xml")
-
-    if mimetype == "image/svg+xml":
-        return Response(content=path.read_text(encoding="utf-8", errors="replace"), media_type="image/svg+xml")
     return FileResponse(str(path), media_type=mimetype)
 
 
+def _readiconsvg(path: Path) -> str | None:
+    try:
+        return path.read_text(encoding="utf-8", errors="replace")
+    except OSError:
+        return None
+
+
 @app.post("/api/apps/icon")
 async def uploadappicon(request: Request, appid: str = Form(...), file: UploadFile = File(...)):
     guard = require_auth_api(request)
@@ -812,8 +3207,8 @@ async def uploadappicon(request: Request, appid: str = Form(...), file: UploadFi
     safename = f"{appid}{ext}"
     outpath = ICONSDIR / safename
     data = await file.read()
-    outpath.write_bytes(data)
-    seticonmeta(appid, safename, mimetype)
+    await runio(outpath.write_bytes, data)
+    await runio(seticonmeta, appid, safename, mimetype)
     return {"ok": True, "icon_url": iconurl(appid)}
 
 
@@ -889,6 +3284,710 @@ def updates_apply() -> dict[str, Any]:
     return {"ok": True, "supported": True, "status": "updated", "log": out}
 
 
+# ---------------- Backup ----------------
+# Архив собирается на лету в отдельном потоке и отдаётся клиенту кусками через ограниченную очередь:
+# ни временного архива на диске, ни всего архива в памяти. Медленный клиент просто притормаживает запись.
+# Правила: backup_exclude из каталога (шаблоны внутри каталога приложения, напр. "downloads"),
+# плюс exclude/include из запроса в виде "<appid>/<шаблон>" ("*" вместо appid — для всех приложений).
+BACKUPCHUNK = 1024 * 1024
+BACKUPQUEUE = 8
+BACKUPFORMATS = {
+    "zip": ("application/zip", "zip"),
+    "tar.gz": ("application/gzip", "tar.gz"),
+    "tar.zst": ("application/zstd", "tar.zst"),
+}
+
+
+BACKUPBLOCK = 1024 * 1024
+BACKUPLEVEL = 6
+# Уже сжатые форматы: повторное сжатие только тратит CPU, такие файлы пишем как есть (level 0)
+MEDIAEXT = {
+    ".mkv", ".mp4", ".avi", ".mov", ".webm", ".m4v", ".ts",
+    ".jpg", ".jpeg", ".png", ".gif", ".webp", ".heic",
+    ".mp3", ".flac", ".ogg", ".opus", ".m4a", ".aac",
+    ".zip", ".gz", ".tgz", ".bz2", ".xz", ".zst", ".7z", ".rar",
+}
+
+
+def ismedia(path: str) -> bool:
+    return os.path.splitext(path)[1].lower() in MEDIAEXT
+
+
+class BackupAborted(Exception):
+    pass
+
+
+class _ChunkWriter:
+    """Неперематываемый поток для _ParallelZip/tarfile: копит байты и отдаёт куски по BACKUPCHUNK в очередь."""
+
+    def __init__(self, q: queue.Queue, stop: threading.Event):
+        self.q = q
+        self.stop = stop
+        self.buf = bytearray()
+
+    def write(self, data) -> int:
+        self.buf += data
+        if len(self.buf) >= BACKUPCHUNK:
+            self._put(bytes(self.buf))
+            self.buf.clear()
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def _put(self, item) -> None:
+        while True:
+            if self.stop.is_set():
+                raise BackupAborted()
+            try:
+                self.q.put(item, timeout=1.0)
+                return
+            except queue.Full:
+                continue
+
+    def finish(self, err: Exception | None = None) -> None:
+        if self.buf and err is None:
+            self._put(bytes(self.buf))
+            self.buf.clear()
+        self._put(err)
+
+
+def _deflateblock(data: bytes, level: int) -> bytes:
+    c = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    return c.compress(data) + c.flush(zlib.Z_FULL_FLUSH)
+
+
+class _ParallelGzip:
+    """gzip-поток как у pigz: вход режется на блоки по BACKUPBLOCK, блоки сжимаются raw deflate
+    параллельно в cpu-пуле (zlib отпускает GIL) и пишутся строго по порядку. Z_FULL_FLUSH выравнивает каждый
+    блок по байту и сбрасывает словарь, поэтому склейка — один корректный deflate-поток."""
+
+    def __init__(self, out, level: int):
+        self.out = out
+        self.level = level
+        self.depth = CPUWORKERS * 2
+        self.buf = bytearray()
+        self.pending: deque = deque()
+        self.crc = 0
+        self.size = 0
+        out.write(b"\x1f\x8b\x08\x00" + struct.pack("<I", int(time.time())) + b"\x00\xff")
+
+    def write(self, data) -> int:
+        self.buf += data
+        while len(self.buf) >= BACKUPBLOCK:
+            self._submit(bytes(self.buf[:BACKUPBLOCK]))
+            del self.buf[:BACKUPBLOCK]
+        return len(data)
+
+    def setlevel(self, level: int) -> None:
+        if level != self.level:
+            # Блок не должен смешивать данные с разными уровнями
+            if self.buf:
+                self._submit(bytes(self.buf))
+                self.buf.clear()
+            self.level = level
+
+    def _submit(self, block: bytes) -> None:
+        self.crc = zlib.crc32(block, self.crc)
+        self.size += len(block)
+        self.pending.append(poolsubmit("cpu", _deflateblock, block, self.level))
+        while len(self.pending) > self.depth:
+            self.out.write(self.pending.popleft().result())
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        if self.buf:
+            self._submit(bytes(self.buf))
+            self.buf.clear()
+        while self.pending:
+            self.out.write(self.pending.popleft().result())
+        # Пустой финальный блок + трейлер gzip
+        self.out.write(zlib.compressobj(0, zlib.DEFLATED, -zlib.MAX_WBITS).flush())
+        self.out.write(struct.pack("<II", self.crc, self.size & 0xFFFFFFFF))
+
+
+ZIP64LIMIT = 0xFFFFFFFF
+
+
+def _dosdatetime(ts: float) -> tuple[int, int]:
+    t = time.localtime(ts)
+    if t.tm_year < 1980:
+        return 0, (0 << 9) | (1 << 5) | 1
+    return (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2), ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+
+
+class _ParallelZip:
+    """Потоковый zip с тем же конвейером, что _ParallelGzip: каждый файл режется на блоки по BACKUPBLOCK,
+    блоки сжимаются в cpu-пуле и пишутся по порядку. Очередь общая для всех файлов — мелкие файлы тоже
+    сжимаются параллельно. Выход не перематывается, поэтому CRC и размеры идут в data descriptor
+    (флаг 3) после данных и в центральный каталог; большие файлы и смещения — через ZIP64."""
+
+    def __init__(self, out, level: int):
+        self.out = out
+        self.level = level
+        self.depth = CPUWORKERS * 2
+        # (вид, данные, запись): header / data / block (future) / end — пишутся строго по порядку
+        self.pending: deque = deque()
+        self.futures = 0
+        self.offset = 0
+        self.entries: list[dict[str, Any]] = []
+
+    def _emit(self, data: bytes) -> None:
+        self.out.write(data)
+        self.offset += len(data)
+
+    def _push(self, kind: str, item, entry: dict) -> None:
+        self.pending.append((kind, item, entry))
+        if kind == "block":
+            self.futures += 1
+        self._drain(self.depth)
+
+    def _drain(self, depth: int) -> None:
+        while self.pending and (self.futures > depth or self.pending[0][0] != "block"):
+            kind, item, entry = self.pending.popleft()
+            if kind == "header":
+                entry["offset"] = self.offset
+                self._emit(self._header(entry))
+            elif kind == "end":
+                fmt = "<IIQQ" if entry["zip64"] else "<IIII"
+                self._emit(struct.pack(fmt, 0x08074B50, entry["crc"], entry["csize"], entry["usize"]))
+            else:
+                if kind == "block":
+                    self.futures -= 1
+                    item = item.result()
+                entry["csize"] += len(item)
+                self._emit(item)
+
+    def _header(self, entry: dict) -> bytes:
+        name = entry["name"].encode("utf-8")
+        extra = struct.pack("<HHQQ", 1, 16, 0, 0) if entry["zip64"] else b""
+        size = ZIP64LIMIT if entry["zip64"] else 0
+        return struct.pack(
+            "<IHHHHHIIIHH", 0x04034B50, 45 if entry["zip64"] else 20, 0x0808, entry["method"],
+            entry["time"], entry["date"], 0, size, size, len(name), len(extra),
+        ) + name + extra
+
+    def add(self, f, name: str, mtime: float, mode: int, size: int, compress: bool = True) -> None:
+        tm, dt = _dosdatetime(mtime)
+        compress = compress and self.level > 0
+        entry = {
+            "name": name, "method": 8 if compress else 0, "time": tm, "date": dt, "mode": mode,
+            "crc": 0, "csize": 0, "usize": 0, "offset": 0,
+            # Как zipfile: запас на случай, если файл подрос, пока его читаем
+            "zip64": size * 1.05 > ZIP64LIMIT,
+        }
+        self.entries.append(entry)
+        self._push("header", None, entry)
+        while True:
+            block = f.read(BACKUPBLOCK)
+            if not block:
+                break
+            entry["crc"] = zlib.crc32(block, entry["crc"])
+            entry["usize"] += len(block)
+            if compress:
+                self._push("block", poolsubmit("cpu", _deflateblock, block, self.level), entry)
+            else:
+                self._push("data", block, entry)
+        if compress:
+            # Пустой финальный блок закрывает deflate-поток файла
+            self._push("data", zlib.compressobj(0, zlib.DEFLATED, -zlib.MAX_WBITS).flush(), entry)
+        self._push("end", None, entry)
+
+    def close(self) -> None:
+        self._drain(0)
+        cdstart = self.offset
+        for e in self.entries:
+            name = e["name"].encode("utf-8")
+            big = [v for v in (e["usize"], e["csize"], e["offset"]) if v >= ZIP64LIMIT]
+            extra = struct.pack("<HH", 1, 8 * len(big)) + b"".join(struct.pack("<Q", v) for v in big) if big else b""
+            self._emit(
+                struct.pack(
+                    "<IHHHHHHIIIHHHHHII", 0x02014B50, (3 << 8) | 45, 45 if big or e["zip64"] else 20, 0x0808, e["method"],
+                    e["time"], e["date"], e["crc"], min(e["csize"], ZIP64LIMIT), min(e["usize"], ZIP64LIMIT),
+                    len(name), len(extra), 0, 0, 0, (e["mode"] & 0xFFFF) << 16, min(e["offset"], ZIP64LIMIT),
+                ) + name + extra
+            )
+        cdsize = self.offset - cdstart
+        count = len(self.entries)
+        if count >= 0xFFFF or cdstart >= ZIP64LIMIT or cdsize >= ZIP64LIMIT:
+            eocd64 = self.offset
+            self._emit(struct.pack("<IQHHIIQQQQ", 0x06064B50, 44, (3 << 8) | 45, 45, 0, 0, count, count, cdsize, cdstart))
+            self._emit(struct.pack("<IIQI", 0x07064B50, 0, eocd64, 1))
+        self._emit(struct.pack("<IHHHHIIH", 0x06054B50, 0, 0, min(count, 0xFFFF), min(count, 0xFFFF), min(cdsize, ZIP64LIMIT), min(cdstart, ZIP64LIMIT), 0))
+
+
+def _splitrules(text: str | None) -> list[tuple[str, str]]:
+    out = []
+    for item in (text or "").split(","):
+        appid, sep, pattern = item.strip().strip("/").partition("/")
+        if sep and appid and pattern:
+            out.append((appid, pattern.strip("/")))
+    return out
+
+
+def backuprules(apps: list[str] | None = None, include: str | None = None, exclude: str | None = None) -> dict[str, list[str]]:
+    """appid -> шаблоны исключений. include снимает исключение из каталога, exclude добавляет своё."""
+    inc = _splitrules(include)
+    exc = _splitrules(exclude)
+    rules: dict[str, list[str]] = {}
+    for appid, meta in APPCATALOG.items():
+        if apps and appid not in apps:
+            continue
+        pats = [p for p in meta.get("backup_exclude") or [] if not any(a in (appid, "*") and p == pat for a, pat in inc)]
+        pats += [pat for a, pat in exc if a in (appid, "*")]
+        rules[appid] = pats
+    return rules
+
+
+def _backupexcluded(rel: str, patterns: list[str]) -> bool:
+    name = rel.rsplit("/", 1)[-1]
+    for p in patterns:
+        # Как в .gitignore: шаблон без "/" — имя на любой глубине, с "/" — путь от каталога приложения
+        if "/" in p.rstrip("/") and fnmatch.fnmatch(rel, p.rstrip("/")):
+            return True
+        if "/" not in p.rstrip("/") and fnmatch.fnmatch(name, p.rstrip("/")):
+            return True
+    return False
+
+
+def backupfiles(rules: dict[str, list[str]]):
+    """(путь, имя в архиве) для файлов приложений; исключённые каталоги даже не обходятся."""
+    for appid, patterns in rules.items():
+        root = appdir(appid)
+        if not root.is_dir():
+            continue
+        for dirpath, dirnames, filenames in os.walk(root):
+            reldir = os.path.relpath(dirpath, root)
+            reldir = "" if reldir == "." else reldir.replace(os.sep, "/") + "/"
+            dirnames[:] = sorted(d for d in dirnames if not _backupexcluded(reldir + d, patterns))
+            for name in sorted(filenames):
+                if _backupexcluded(reldir + name, patterns):
+                    continue
+                path = os.path.join(dirpath, name)
+                if os.path.isfile(path):
+                    yield path, f"apps/{appid}/{reldir}{name}"
+
+
+def _dbsnapshot() -> str:
+    fd, path = tempfile.mkstemp(prefix="backup-", suffix=".db")
+    os.close(fd)
+    src = sqlite3.connect(DBPATH)
+    dst = sqlite3.connect(path)
+    try:
+        src.backup(dst)
+    finally:
+        dst.close()
+        src.close()
+    return path
+
+
+def writebackup(out: _ChunkWriter, fmt: str, rules: dict[str, list[str]], level: int = BACKUPLEVEL) -> None:
+    skipped: list[dict[str, str]] = []
+    manifest = {
+        "version": VERSION,
+        "created": datetime.utcnow().isoformat(),
+        "apps": sorted(rules),
+        "exclude": rules,
+        "skipped": skipped,
+    }
+    dbpath = _dbsnapshot()
+    try:
+        if fmt == "zip":
+            z = _ParallelZip(out, level)
+            for path, arcname in itertools.chain([(dbpath, "app.db")], backupfiles(rules)):
+                try:
+                    with open(path, "rb") as f:
+                        st = os.fstat(f.fileno())
+                        z.add(f, arcname, st.st_mtime, st.st_mode, st.st_size, compress=not ismedia(path))
+                except OSError as e:
+                    skipped.append({"path": arcname, "error": str(e)})
+            data = json.dumps(manifest, ensure_ascii=False, indent=2).encode("utf-8")
+            z.add(io.BytesIO(data), "backup.json", time.time(), 0o100644, len(data))
+            z.close()
+            return
+
+        if fmt == "tar.zst":
+            zst = zstandard.ZstdCompressor(level=max(1, level), threads=CPUWORKERS).stream_writer(out, closefd=False)
+            return _writetar(zst, dbpath, rules, manifest)
+        _writetar(_ParallelGzip(out, level), dbpath, rules, manifest, level)
+    finally:
+        os.unlink(dbpath)
+
+
+def _writetar(stream, dbpath: str, rules: dict[str, list[str]], manifest: dict, level: int | None = None) -> None:
+    """level задан — поток умеет менять уровень на лету (_ParallelGzip): медиа пишем без сжатия."""
+    skipped = manifest["skipped"]
+    with tarfile.open(fileobj=stream, mode="w|") as t:
+        t.add(dbpath, arcname="app.db", recursive=False)
+        for path, arcname in backupfiles(rules):
+            if level is not None:
+                stream.setlevel(0 if ismedia(path) else level)
+            try:
+                t.add(path, arcname=arcname, recursive=False)
+            except OSError as e:
+                skipped.append({"path": arcname, "error": str(e)})
+        data = json.dumps(manifest, ensure_ascii=False, indent=2).encode("utf-8")
+        info = tarfile.TarInfo("backup.json")
+        info.size = len(data)
+        info.mtime = int(time.time())
+        if level is not None:
+            stream.setlevel(level)
+        t.addfile(info, io.BytesIO(data))
+    stream.close()
+
+
+def streambackup(fmt: str, rules: dict[str, list[str]], level: int = BACKUPLEVEL):
+    """Синхронный генератор для StreamingResponse (Starlette крутит его в пуле потоков)."""
+    q: queue.Queue = queue.Queue(maxsize=BACKUPQUEUE)
+    stop = threading.Event()
+    out = _ChunkWriter(q, stop)
+
+    def produce() -> None:
+        try:
+            writebackup(out, fmt, rules, level)
+            out.finish()
+        except BackupAborted:
+            pass
+        except Exception as e:
+            try:
+                out.finish(e)
+            except BackupAborted:
+                pass
+
+    threading.Thread(target=produce, name="backup", daemon=True).start()
+    try:
+        while True:
+            item = q.get()
+            if item is None:
+                return
+            if isinstance(item, Exception):
+                # Заголовки уже отправлены — обрываем передачу, клиент получит неполный файл
+                raise item
+            yield item
+    finally:
+        stop.set()
+
+
+# ---------------- Incremental backups ----------------
+# Хранилище BACKUPSDIR: chunks/<2 символа>/<blake2b> — куски файлов, каждый хранится один раз;
+# manifests/<id>.json.gz — список файлов бэкапа со ссылками на куски; сводка — в таблице backups.
+# Границы кусков зависят от содержимого (gear-хэш окна в 32 байта проверяется в каждой позиции),
+# поэтому вставка в середину файла меняет только соседние куски — на любых данных, включая текст.
+# Файл с теми же size/mtime/inode, что в прошлом бэкапе, не читается вовсе — ссылки на куски
+# берутся из прошлого манифеста.
+# Все операции идут задачами kind="backup" с appid="system" — планировщик выполняет их по одной.
+CHUNKMIN = 512 * 1024
+CHUNKMAX = 4 * 1024 * 1024
+CHUNKBITS = 19  # граница в среднем раз в 512 КБ после CHUNKMIN: куски ~1 МБ
+CHUNKWINDOW = 32
+CHUNKSCAN = 128 * 1024
+CHUNKLEVEL = 1
+BACKUPAPPID = "system"
+
+# Gear-хэш: h(i) = XOR по k < CHUNKWINDOW от GEAR[buf[i-k]] << k. Побайтовый цикл в Python — ~4 МБ/с,
+# поэтому блок считается целиком: каждый байт — 64-битная «дорожка» большого целого, окно собирается
+# удвоением (x ^= x << (64*s + s)). XOR не даёт переносов, а сдвиги внутри дорожки не выходят за её
+# 64 бита (32 бита GEAR + сдвиг до 31), так что дорожки не смешиваются. Граница — нули в битах
+# [CHUNKWINDOW-1, CHUNKWINDOW-1+CHUNKBITS): они зависят от всех байт окна.
+# Таблица выводится из blake2b — границы не меняются между версиями Python.
+GEAR = [int.from_bytes(hashlib.blake2b(bytes([b]), digest_size=4).digest(), "little") for b in range(256)]
+_GEARTABS = [bytes((g >> (8 * i)) & 0xFF for g in GEAR) for i in range(4)]
+_GEARLANE = (((1 << CHUNKBITS) - 1) << (CHUNKWINDOW - 1)).to_bytes(8, "little")
+_GEARMASKS: dict[int, int] = {}
+
+
+def _gearhits(block: bytes):
+    """Позиции i в block (i >= CHUNKWINDOW-1), где хэш окна block[i-CHUNKWINDOW+1 : i+1] проходит маску."""
+    n = len(block)
+    lanes = bytearray(8 * n)
+    for k, tab in enumerate(_GEARTABS):
+        lanes[k::8] = block.translate(tab)
+    x = int.from_bytes(lanes, "little")
+    step = 1
+    while step < CHUNKWINDOW:
+        x ^= x << (64 * step + step)
+        step *= 2
+    mask = _GEARMASKS.get(n)
+    if mask is None:
+        if len(_GEARMASKS) > 4:
+            _GEARMASKS.clear()
+        mask = _GEARMASKS[n] = int.from_bytes(_GEARLANE * n, "little")
+    m = (x & mask).to_bytes(8 * n, "little")
+    zero = bytes(8)
+    j = m.find(zero, 8 * (CHUNKWINDOW - 1))
+    while j != -1:
+        if j % 8 == 0:
+            yield j // 8
+            j = m.find(zero, j + 8)
+        else:
+            j = m.find(zero, j + 1)
+
+
+def chunkcut(buf, start: int) -> int:
+    """Конец куска, начинающегося в buf[start]. В buf — не меньше CHUNKMAX байт после start либо весь остаток входа."""
+    end = min(len(buf), start + CHUNKMAX)
+    # Окно первой проверяемой позиции (start + CHUNKMIN) захватывает CHUNKWINDOW-1 байт перед ней
+    pos = start + CHUNKMIN - (CHUNKWINDOW - 1)
+    while pos + CHUNKWINDOW - 1 < end:
+        block = bytes(buf[pos : min(end, pos + CHUNKSCAN)])
+        for i in _gearhits(block):
+            return pos + i + 1
+        pos += len(block) - (CHUNKWINDOW - 1)
+    return end
+
+
+def filechunks(f):
+    buf = b""
+    pos = 0
+    eof = False
+    while True:
+        if not eof and len(buf) - pos < CHUNKMAX:
+            more = f.read(CHUNKMAX * 2)
+            eof = not more
+            buf = buf[pos:] + more
+            pos = 0
+            continue
+        if pos >= len(buf):
+            return
+        cut = chunkcut(buf, pos)
+        yield buf[pos:cut]
+        pos = cut
+
+
+def _chunkpath(h: str) -> Path:
+    return BACKUPSDIR / "chunks" / h[:2] / h
+
+
+def putchunk(data: bytes) -> tuple[str, int]:
+    """Кладёт кусок в хранилище, если его там ещё нет. Возвращает (хэш, сколько байт записано на диск)."""
+    h = hashlib.blake2b(data, digest_size=32).hexdigest()
+    path = _chunkpath(h)
+    if path.exists():
+        return h, 0
+    packed = zlib.compress(data, CHUNKLEVEL)
+    blob = b"Z" + packed if len(packed) < len(data) else b"R" + data
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{h}.{uuid.uuid4().hex[:8]}.tmp")
+    tmp.write_bytes(blob)
+    os.replace(tmp, path)
+    return h, len(blob)
+
+
+def getchunk(h: str) -> bytes:
+    blob = _chunkpath(h).read_bytes()
+    data = zlib.decompress(blob[1:]) if blob[:1] == b"Z" else blob[1:]
+    if hashlib.blake2b(data, digest_size=32).hexdigest() != h:
+        raise ValueError(f"кусок {h[:12]} повреждён")
+    return data
+
+
+def _manifestpath(backupid: str) -> Path:
+    return BACKUPSDIR / "manifests" / f"{backupid}.json.gz"
+
+
+def loadmanifest(backupid: str) -> dict:
+    with gzip.open(_manifestpath(backupid), "rt", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _savemanifest(manifest: dict) -> None:
+    path = _manifestpath(manifest["id"])
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    with gzip.open(tmp, "wt", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp, path)
+
+
+def listbackups() -> list[dict]:
+    with db() as conn:
+        rows = conn.execute("SELECT * FROM backups ORDER BY createdat DESC").fetchall()
+    return [dict(r) for r in rows]
+
+
+def _lastmanifest() -> dict | None:
+    for b in listbackups():
+        try:
+            return loadmanifest(b["id"])
+        except (OSError, ValueError):
+            continue
+    return None
+
+
+def createbackup(progress=None) -> dict:
+    started = time.monotonic()
+    backupid = datetime.utcnow().strftime("%Y%m%d-%H%M%S-") + uuid.uuid4().hex[:6]
+    rules = backuprules()
+    prev = {e["path"]: e for e in (_lastmanifest() or {}).get("files", [])}
+
+    # Сначала stat всего дерева — чтобы знать общий объём для прогресса
+    todo = []
+    for path, arcname in backupfiles(rules):
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        todo.append((path, arcname, st))
+    total = sum(st.st_size for _, _, st in todo)
+
+    stats = {"files": 0, "bytes": 0, "newbytes": 0, "storedbytes": 0, "skipped": 0}
+    files: list[dict] = []
+    done = 0
+
+    def report(final: bool = False) -> None:
+        if progress:
+            progress(
+                {
+                    "phase": "backup",
+                    "current": done,
+                    "total": total,
+                    "pct": int(done * 100 / total) if total else 100,
+                    "files": stats["files"],
+                    "files_total": len(todo) + 1,
+                    "new": stats["newbytes"],
+                },
+                final,
+            )
+
+    def addfile(path: str, arcname: str, st: os.stat_result, reuse: bool) -> None:
+        old = prev.get(arcname)
+        entry = {"path": arcname, "size": st.st_size, "mtime": st.st_mtime_ns, "ino": st.st_ino, "mode": st.st_mode & 0o7777}
+        if reuse and old and (old["size"], old["mtime"], old["ino"]) == (st.st_size, st.st_mtime_ns, st.st_ino):
+            entry["chunks"] = old["chunks"]
+        else:
+            chunks = []
+            with open(path, "rb") as f:
+                for data in filechunks(f):
+                    h, stored = putchunk(data)
+                    chunks.append([h, len(data)])
+                    if stored:
+                        stats["newbytes"] += len(data)
+                        stats["storedbytes"] += stored
+            entry["chunks"] = chunks
+            entry["size"] = sum(n for _, n in chunks)
+        files.append(entry)
+        stats["files"] += 1
+        stats["bytes"] += entry["size"]
+
+    dbpath = _dbsnapshot()
+    try:
+        addfile(dbpath, "app.db", os.stat(dbpath), reuse=False)
+    finally:
+        os.unlink(dbpath)
+    for path, arcname, st in todo:
+        try:
+            addfile(path, arcname, st, reuse=True)
+        except OSError:
+            stats["skipped"] += 1
+        done += st.st_size
+        report()
+
+    manifest = {"id": backupid, "created": datetime.utcnow().isoformat(), "version": VERSION, "exclude": rules, "files": files}
+    _savemanifest(manifest)
+    seconds = round(time.monotonic() - started, 2)
+    with db() as conn:
+        conn.execute(
+            "INSERT INTO backups(id, createdat, files, bytes, newbytes, storedbytes, skipped, seconds) VALUES(?, ?, ?, ?, ?, ?, ?, ?)",
+            (backupid, manifest["created"], stats["files"], stats["bytes"], stats["newbytes"], stats["storedbytes"], stats["skipped"], seconds),
+        )
+    report(final=True)
+    return {"id": backupid, **stats, "seconds": seconds}
+
+
+def _manifestchunks(manifest: dict) -> dict[str, int]:
+    return {h: n for e in manifest["files"] for h, n in e["chunks"]}
+
+
+def verifybackup(backupid: str, progress=None) -> dict:
+    chunks = _manifestchunks(loadmanifest(backupid))
+    total = sum(chunks.values())
+    done = 0
+    missing: list[str] = []
+    corrupt: list[str] = []
+    for h, n in chunks.items():
+        try:
+            getchunk(h)
+        except FileNotFoundError:
+            missing.append(h)
+        except (OSError, ValueError, zlib.error):
+            corrupt.append(h)
+        done += n
+        if progress:
+            progress({"phase": "verify", "current": done, "total": total, "pct": int(done * 100 / total) if total else 100})
+    return {"id": backupid, "chunks": len(chunks), "missing": missing, "corrupt": corrupt}
+
+
+def restorebackup(backupid: str, progress=None) -> Path:
+    """Восстанавливает в отдельный каталог DATADIR/restore/<id>: живые данные не трогаем."""
+    manifest = loadmanifest(backupid)
+    target = DATADIR / "restore" / backupid
+    if target.exists():
+        shutil.rmtree(target)
+    target.mkdir(parents=True)
+    root = target.resolve()
+    total = sum(e["size"] for e in manifest["files"])
+    done = 0
+    for e in manifest["files"]:
+        dest = (root / e["path"]).resolve()
+        if root not in dest.parents:
+            raise ValueError(f"недопустимый путь в манифесте: {e['path']}")
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        with open(dest, "wb") as f:
+            for h, _ in e["chunks"]:
+                f.write(getchunk(h))
+        os.chmod(dest, e["mode"])
+        os.utime(dest, ns=(e["mtime"], e["mtime"]))
+        done += e["size"]
+        if progress:
+            progress({"phase": "restore", "current": done, "total": total, "pct": int(done * 100 / total) if total else 100})
+    return target
+
+
+def deletebackup(backupid: str) -> dict:
+    """Удаляет манифест и куски, на которые больше не ссылается ни один бэкап."""
+    _manifestpath(backupid).unlink(missing_ok=True)
+    with db() as conn:
+        conn.execute("DELETE FROM backups WHERE id=?", (backupid,))
+    live: set[str] = set()
+    for b in listbackups():
+        live.update(_manifestchunks(loadmanifest(b["id"])))
+    removed = freed = 0
+    root = BACKUPSDIR / "chunks"
+    if root.is_dir():
+        for sub in root.iterdir():
+            for p in sub.iterdir():
+                if p.name not in live:
+                    freed += p.stat().st_size
+                    p.unlink()
+                    removed += 1
+    return {"removed": removed, "freed": freed}
+
+
+def backupjob(action: str | None, progress=None) -> tuple[bool, str]:
+    op, _, backupid = (action or "").partition(":")
+    if op == "create":
+        r = createbackup(progress)
+        return True, (
+            f"{r['id']}: {r['files']} файлов, {fmt_bytes(r['bytes'])}, новых {fmt_bytes(r['newbytes'])} "
+            f"(на диске {fmt_bytes(r['storedbytes'])}), {r['seconds']} с"
+        )
+    if not backupid or not _manifestpath(backupid).exists():
+        return False, "Бэкап не найден"
+    if op == "verify":
+        r = verifybackup(backupid, progress)
+        if r["missing"] or r["corrupt"]:
+            return False, f"{backupid}: нет {len(r['missing'])}, повреждено {len(r['corrupt'])} из {r['chunks']} кусков"
+        return True, f"{backupid}: все {r['chunks']} кусков в порядке"
+    if op == "restore":
+        return True, f"Восстановлено в {restorebackup(backupid, progress)}"
+    if op == "delete":
+        r = deletebackup(backupid)
+        return True, f"{backupid} удалён, освобождено {fmt_bytes(r['freed'])} ({r['removed']} кусков)"
+    return False, "Неизвестное действие"
+
+
 # ---------------- HTML Pages ----------------
 @app.get("/", response_class=HTMLResponse)
 async def index(request: Request):
@@ -983,7 +4082,7 @@ async def api_bootstrap(request: Request):
         "user": request.session.get("user"),
         "theme": gettheme(),
         "version": VERSION,
-        "dockerpresent": dockerpresent(),
+        "dockerpresent": await runio(dockerpresent),
     }
 
 
@@ -997,7 +4096,7 @@ async def api_setup(request: Request, payload: dict = Body(...)):
         return JSONResponse({"ok": False, "error": "login_short"}, status_code=400)
     if len(password) < 6:
         return JSONResponse({"ok": False, "error": "password_short"}, status_code=400)
-    createsingleuser(login, password)
+    await runcpu(createsingleuser, login, password)
     request.session["user"] = login
     return {"ok": True}
 
@@ -1008,7 +4107,7 @@ async def api_login(request: Request, payload: dict = Body(...)):
         return JSONResponse({"ok": False, "error": "first_run"}, status_code=400)
     login = str(payload.get("login", "")).strip()
     password = str(payload.get("password", ""))
-    if not verifylogin(login, password):
+    if not await runcpu(verifylogin, login, password):
         return JSONResponse({"ok": False, "error": "bad_credentials"}, status_code=401)
     request.session["user"] = login
     return {"ok": True}
@@ -1026,7 +4125,7 @@ async def api_theme(request: Request, payload: dict = Body(...)):
     if guard:
         return guard
     theme = str(payload.get("theme", "dark"))
-    settheme(theme)
+    await runio(settheme, theme)
     return {"ok": True, "theme": gettheme()}
 
 
@@ -1047,7 +4146,7 @@ async def api_widgets_set(request: Request, payload: dict = Body(...)):
     layout = payload.get("layout")
     if not isinstance(widgets, list) or not isinstance(layout, list):
         return JSONResponse({"ok": False, "error": "bad_payload"}, status_code=400)
-    cfg = set_widgets_config(widgets, layout)
+    cfg = await runio(set_widgets_config, widgets, layout)
     return {"ok": True, "config": cfg}
 
 
@@ -1061,12 +4160,119 @@ async def api_tiles(request: Request):
     return {"ok": True, "tiles": tiles}
 
 
+@app.get("/api/events")
+async def api_events(request: Request):
+    guard = require_auth_api(request)
+    if guard:
+        return guard
+
+    q: asyncio.Queue = asyncio.Queue(maxsize=EVENTQUEUE)
+
+    async def stream():
+        _SUBSCRIBERS.add(q)
+        try:
+            # Начальное состояние, дальше только изменения
+            yield "retry: 3000\n\n"
+            yield f"event: tiles\ndata: {json.dumps(build_tiles_for_widgets(get_widgets_config()['widgets']), ensure_ascii=False)}\n\n"
+            jobs = await runio(getjobs, 80)
+            yield f"event: jobs\ndata: {json.dumps(jobs, ensure_ascii=False)}\n\n"
+            while True:
+                try:
+                    msg = await asyncio.wait_for(q.get(), timeout=EVENTHEARTBEAT)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": ping\n\n"
+                    continue
+                if msg is None:
+                    break
+                yield msg
+        finally:
+            _SUBSCRIBERS.discard(q)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/api/metrics/history")
+async def api_metrics_history(
+    request: Request,
+    metric: str = Query(...),
+    range_: str = Query("1h", alias="range"),
+    step: str | None = Query(None),
+):
+    guard = require_auth_api(request)
+    if guard:
+        return guard
+    if metric not in HISTORYMETRICS:
+        return JSONResponse({"ok": False, "error": "unknown_metric"}, status_code=404)
+    seconds = parse_duration(range_)
+    stepsec = parse_duration(step) if step else None
+    if not seconds or seconds <= 0 or (step and not stepsec):
+        return JSONResponse({"ok": False, "error": "bad_range"}, status_code=400)
+    ring = HISTORY.get(metric)
+    if ring is None:
+        return {"ok": True, "metric": metric, "step": None, "points": []}
+    realstep, points = ring.query(seconds, stepsec)
+    # points: [ts, min, avg, max]
+    return {"ok": True, "metric": metric, "step": realstep, "points": points}
+
+
 @app.get("/api/jobs")
-async def api_jobs(request: Request, limit: int = 50):
+async def api_jobs(
+    request: Request,
+    limit: int = Query(50, ge=1, le=500),
+    before: str | None = None,
+    appid: str | None = None,
+    status: str | None = None,
+    since_seq: int | None = Query(None, ge=0),
+    wait: float = Query(0, ge=0),
+):
+    guard = require_auth_api(request)
+    if guard:
+        return guard
+    if since_seq is not None:
+        # Дельта: только изменившиеся строки; wait — ждать первого изменения (long-poll)
+        # Номер читаем до выборки: всё, что закоммитят позже, получит номер больше него
+        waiter = jobwaiter() if wait else None
+        try:
+            seq = await runio(jobsseq)
+            jobs = await runio(jobschanged, since_seq, limit)
+            if not jobs and waiter is not None and seq == since_seq:
+                await waitjobs(waiter, min(wait, JOBWAITMAX))
+                seq = await runio(jobsseq)
+                jobs = await runio(jobschanged, since_seq, limit)
+        finally:
+            if waiter is not None:
+                _JOBWAITERS.discard(waiter)
+        if len(jobs) >= limit:
+            seq = jobs[-1]["updatedseq"]
+        elif jobs:
+            seq = max(seq, jobs[-1]["updatedseq"])
+        return {"ok": True, "jobs": jobs, "seq": seq}
+    seq = await runio(jobsseq)
+    cursor = None
+    if before:
+        cursor = parsejobcursor(before)
+        if cursor is None:
+            return JSONResponse({"ok": False, "error": "bad_cursor"}, status_code=400)
+    statuses = [x.strip() for x in (status or "").split(",") if x.strip()] or None
+    jobs = await runio(getjobs, limit + 1, cursor, appid, statuses)
+    nextcursor = jobcursor(jobs[limit - 1]) if len(jobs) > limit else None
+    return {"ok": True, "jobs": jobs[:limit], "next_cursor": nextcursor, "seq": seq}
+
+
+@app.post("/api/jobs/{jobid}/cancel")
+async def api_job_cancel(request: Request, jobid: str):
     guard = require_auth_api(request)
     if guard:
         return guard
-    return {"ok": True, "jobs": getjobs(limit=int(limit))}
+    if not await canceljob(jobid):
+        return JSONResponse({"ok": False, "error": "not_queued"}, status_code=409)
+    return {"ok": True}
 
 
 def _app_spec_for_ui(appid: str) -> dict[str, Any]:
@@ -1091,30 +4297,31 @@ def _app_spec_for_ui(appid: str) -> dict[str, Any]:
     return {"env": env, "ports": ports, "volumes": volumes}
 
 
+def appsummary(appid: str, st: dict) -> dict[str, Any]:
+    meta = APPCATALOG.get(appid) or {}
+    containers = st.get("containers") or []
+    return {
+        "id": appid,
+        "title": meta.get("title", appid),
+        "desc": meta.get("description", ""),
+        "tags": meta.get("tags", []),
+        "installed": bool(st.get("ok") and containers),
+        "running": bool(st.get("running")),
+        "url": meta.get("default_url"),
+        "icon_url": iconurl(appid),
+        "containers": [c.get("name") for c in containers],
+        "states": {c.get("name"): c.get("status") for c in containers},
+    }
+
+
 @app.get("/api/apps")
 async def api_apps(request: Request):
     guard = require_auth_api(request)
     if guard:
         return guard
 
-    out = []
-    for appid, meta in APPCATALOG.items():
-        st = appstatus(appid)
-        containers = st.get("containers") or []
-        installed = bool(st.get("ok") and containers)
-        out.append(
-            {
-                "id": appid,
-                "title": meta.get("title", appid),
-                "desc": meta.get("description", ""),
-                "tags": meta.get("tags", []),
-                "installed": installed,
-                "running": bool(st.get("running")),
-                "url": meta.get("default_url"),
-                "icon_url": iconurl(appid),
-                "containers": [c.get("name") for c in containers],
-            }
-        )
+    statuses = await runio(appsstatus)
+    out = [appsummary(appid, statuses[appid]) for appid in APPCATALOG]
     return {"ok": True, "apps": out}
 
 
@@ -1127,7 +4334,8 @@ async def api_app_detail(request: Request, appid: str):
         return JSONResponse({"ok": False, "error": "not_found"}, status_code=404)
 
     meta = APPCATALOG[appid]
-    st = appstatus(appid)
+    st = await runio(appstatus, appid)
+    pull = await runio(getpullpolicy, appid)
     spec = _app_spec_for_ui(appid)
     containers = st.get("containers") or []
     installed = bool(st.get("ok") and containers)
@@ -1146,10 +4354,38 @@ async def api_app_detail(request: Request, appid: str):
             "env": spec["env"],
             "ports": spec["ports"],
             "volumes": spec["volumes"],
+            "pull": pull,
+            "stats": appcontainerstats(appid),
         },
     }
 
 
+@app.get("/api/apps/{appid}/stats/history")
+async def api_app_stats_history(
+    request: Request,
+    appid: str,
+    metric: str = Query(...),
+    range_: str = Query("1h", alias="range"),
+    step: str | None = Query(None),
+):
+    guard = require_auth_api(request)
+    if guard:
+        return guard
+    if appid not in APPCATALOG:
+        return JSONResponse({"ok": False, "error": "not_found"}, status_code=404)
+    if metric not in CSTATSMETRICS:
+        return JSONResponse({"ok": False, "error": "unknown_metric"}, status_code=404)
+    seconds = parse_duration(range_)
+    stepsec = parse_duration(step) if step else None
+    if not seconds or seconds <= 0 or (step and not stepsec):
+        return JSONResponse({"ok": False, "error": "bad_range"}, status_code=400)
+    ring = CSTATSHISTORY.get((appid, metric))
+    if ring is None:
+        return {"ok": True, "metric": metric, "step": None, "points": []}
+    realstep, points = ring.query(seconds, stepsec)
+    return {"ok": True, "metric": metric, "step": realstep, "points": points}
+
+
 @app.post("/api/apps/{appid}/install")
 async def api_app_install(request: Request, appid: str):
     guard = require_auth_api(request)
@@ -1157,8 +4393,7 @@ async def api_app_install(request: Request, appid: str):
         return guard
     if appid not in APPCATALOG:
         return JSONResponse({"ok": False, "error": "not_found"}, status_code=404)
-    jobid = createjob("install", appid, None)
-    asyncio.create_task(runjobinthread(jobid, installapp, appid))
+    jobid = await submitjob("install", appid)
     return {"ok": True, "jobid": jobid}
 
 
@@ -1172,11 +4407,33 @@ async def api_app_action(request: Request, appid: str, payload: dict = Body(...)
     action = str(payload.get("action", "")).strip()
     if action not in ("start", "stop", "restart", "down"):
         return JSONResponse({"ok": False, "error": "bad_action"}, status_code=400)
-    jobid = createjob("action", appid, action)
-    asyncio.create_task(runjobinthread(jobid, actionapp, appid, action))
+    jobid = await submitjob("action", appid, action)
     return {"ok": True, "jobid": jobid}
 
 
+@app.post("/api/apps/{appid}/pull-policy")
+async def api_app_pull_policy(request: Request, appid: str, payload: dict = Body(...)):
+    guard = require_auth_api(request)
+    if guard:
+        return guard
+    if appid not in APPCATALOG:
+        return JSONResponse({"ok": False, "error": "not_found"}, status_code=404)
+    policy = str(payload.get("policy", "")).strip()
+    if policy not in PULLPOLICIES:
+        return JSONResponse({"ok": False, "error": "bad_policy"}, status_code=400)
+    maxage = payload.get("max_age_hours")
+    try:
+        maxage = float(maxage) if maxage is not None else None
+    except (TypeError, ValueError):
+        return JSONResponse({"ok": False, "error": "bad_max_age"}, status_code=400)
+    return {"ok": True, "pull": await runio(setpullpolicy, appid, policy, maxage)}
+
+
+def appcontainernames(appid: str) -> list[str]:
+    """Контейнеры приложения по каталогу: логи отдаются только для них, не для любого имени из запроса."""
+    return [f"serverui-{appid}-{svc['name']}" for svc in APPCATALOG.get(appid, {}).get("services") or []]
+
+
 @app.get("/api/apps/{appid}/logs")
 async def api_app_logs(
     request: Request,
@@ -1187,19 +4444,171 @@ async def api_app_logs(
     guard = require_auth_api(request)
     if guard:
         return guard
+    if appid not in APPCATALOG or container not in appcontainernames(appid):
+        return JSONResponse({"ok": False, "error": "not_found"}, status_code=404)
 
-    client = dockerclient()
+    client = await runio(dockerclient)
     if not client:
         return JSONResponse({"ok": False, "error": "docker_unavailable"}, status_code=503)
 
     try:
-        cont = client.containers.get(container)
-        raw = cont.logs(tail=int(tail))
+        raw = await runio(lambda: client.containers.get(container).logs(tail=int(tail)))
         return {"ok": True, "text": raw.decode("utf-8", errors="replace")}
     except Exception as e:
+        dockerfailed(e)
         return JSONResponse({"ok": False, "error": str(e)}, status_code=500)
 
 
+# Курсор потока логов — RFC3339Nano-метка docker (`timestamps=True`). Go обрезает хвостовые нули
+# в долях секунды, поэтому сравниваем не строки, а (секунды, наносекунды).
+LOGSTREAMBUFFER = 500
+
+
+def _logcursor(ts: str) -> tuple[int, int] | None:
+    try:
+        base, _, frac = ts.rstrip("Z").partition(".")
+        sec = int(datetime.fromisoformat(base).replace(tzinfo=timezone.utc).timestamp())
+        return sec, int((frac or "0")[:9].ljust(9, "0"))
+    except ValueError:
+        return None
+
+
+def _logfollow(container: str, since: str | None, tail: int, emit, stop: threading.Event, holder: dict) -> None:
+    client = dockerclient()
+    if not client:
+        raise DockerException("Docker недоступен")
+    cont = client.containers.get(container)
+    cursor = _logcursor(since) if since else None
+    kwargs: dict[str, Any] = {"stream": True, "follow": True, "timestamps": True}
+    if cursor:
+        kwargs["since"] = cursor[0]
+    else:
+        kwargs["tail"] = tail
+    stream = cont.logs(**kwargs)
+    holder["stream"] = stream
+    buf = b""
+    for chunk in stream:
+        if stop.is_set():
+            break
+        buf += chunk
+        *lines, buf = buf.split(b"\n")
+        for raw in lines:
+            ts, _, text = raw.decode("utf-8", errors="replace").partition(" ")
+            # since у docker — целые секунды: строки до курсора внутри той же секунды пропускаем
+            cur = _logcursor(ts)
+            if cursor and cur and cur <= cursor:
+                continue
+            if not emit(ts, text):
+                return
+
+
+@app.get("/api/apps/{appid}/logs/search")
+async def api_app_logs_search(
+    request: Request,
+    appid: str,
+    q: str = Query(""),
+    since: str | None = Query(None),
+    until: str | None = Query(None),
+    container: str | None = Query(None),
+    limit: int = Query(500, ge=1, le=5000),
+):
+    guard = require_auth_api(request)
+    if guard:
+        return guard
+    if appid not in APPCATALOG:
+        return JSONResponse({"ok": False, "error": "not_found"}, status_code=404)
+    try:
+        t0, t1 = parsetime(since), parsetime(until)
+    except ValueError:
+        return JSONResponse({"ok": False, "error": "bad_time"}, status_code=400)
+
+    names = appcontainernames(appid)
+    if container:
+        if container not in names:
+            return JSONResponse({"ok": False, "error": "bad_container"}, status_code=400)
+        names = [container]
+    res = await runio(searchlogs, names, q, t0, t1, int(limit))
+    return {"ok": True, **res}
+
+
+@app.get("/api/apps/{appid}/logs/stream")
+async def api_app_logs_stream(
+    request: Request,
+    appid: str,
+    container: str = Query(...),
+    since: str | None = Query(None),
+    tail: int = Query(400, ge=1, le=5000),
+):
+    guard = require_auth_api(request)
+    if guard:
+        return guard
+    if appid not in APPCATALOG or container not in appcontainernames(appid):
+        return JSONResponse({"ok": False, "error": "not_found"}, status_code=404)
+    # EventSource при переподключении сам присылает последний id — продолжаем с него
+    since = since or request.headers.get("last-event-id") or None
+
+    loop = asyncio.get_running_loop()
+    q: asyncio.Queue = asyncio.Queue()
+    # Кредиты на строки: поток docker ждёт, пока браузер не разберёт очередь, память ограничена
+    credits = threading.Semaphore(LOGSTREAMBUFFER)
+    stop = threading.Event()
+    holder: dict[str, Any] = {}
+
+    def emit(ts: str, text: str) -> bool:
+        while not credits.acquire(timeout=1):
+            if stop.is_set():
+                return False
+        loop.call_soon_threadsafe(q.put_nowait, (ts, text))
+        return not stop.is_set()
+
+    def run():
+        err = None
+        try:
+            _logfollow(container, since, int(tail), emit, stop, holder)
+        except Exception as e:
+            if not stop.is_set():
+                dockerfailed(e)
+                err = str(e)
+        loop.call_soon_threadsafe(q.put_nowait, ("", err) if err else None)
+
+    async def stream():
+        worker = threading.Thread(target=run, name="logs-follow", daemon=True)
+        worker.start()
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    item = await asyncio.wait_for(q.get(), timeout=EVENTHEARTBEAT)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": ping\n\n"
+                    continue
+                if item is None:
+                    yield "event: end\ndata: {}\n\n"
+                    break
+                ts, text = item
+                if not ts:
+                    yield f"event: fail\ndata: {json.dumps({'error': text}, ensure_ascii=False)}\n\n"
+                    break
+                credits.release()
+                yield f"id: {ts}\ndata: {json.dumps(text, ensure_ascii=False)}\n\n"
+        finally:
+            stop.set()
+            st = holder.get("stream")
+            if st is not None:
+                try:
+                    st.close()
+                except Exception:
+                    pass
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @app.get("/api/system/info")
 async def api_system_info(request: Request):
     guard = require_auth_api(request)
@@ -1211,7 +4620,13 @@ async def api_system_info(request: Request):
         "os": platform.platform(),
         "arch": platform.machine(),
     }
-    return {"ok": True, "info": info, "net": getnetworkinfo(), "dockerpresent": dockerpresent()}
+    return {
+        "ok": True,
+        "info": info,
+        "net": await runio(getnetworkinfo),
+        "dockerpresent": await runio(dockerpresent),
+        "pools": poolstats(),
+    }
 
 
 @app.post("/api/system/password")
@@ -1228,44 +4643,69 @@ async def api_system_password(request: Request, payload: dict = Body(...)):
     u = getsingleuser()
     if not u:
         return JSONResponse({"ok": False, "error": "no_user"}, status_code=400)
-    if not verifylogin(u["username"], current):
+    if not await runcpu(verifylogin, u["username"], current):
         return JSONResponse({"ok": False, "error": "bad_current_password"}, status_code=401)
 
-    setpassword(new)
+    await runcpu(setpassword, new)
     return {"ok": True}
 
 
 @app.get("/api/system/backup")
-async def api_system_backup(request: Request):
+async def api_system_backup(
+    request: Request,
+    format: str = "zip",
+    apps: str | None = None,
+    include: str | None = None,
+    exclude: str | None = None,
+    level: int = Query(BACKUPLEVEL, ge=0, le=9),
+):
     guard = require_auth_api(request)
     if guard:
         return guard
 
+    if format not in BACKUPFORMATS or (format == "tar.zst" and zstandard is None):
+        return JSONResponse({"ok": False, "error": "bad_format"}, status_code=400)
+    applist = [a.strip() for a in (apps or "").split(",") if a.strip()] or None
+    if applist and any(a not in APPCATALOG for a in applist):
+        return JSONResponse({"ok": False, "error": "not_found"}, status_code=404)
+
     DATADIR.mkdir(parents=True, exist_ok=True)
-    with tempfile.TemporaryDirectory() as td:
-        td = Path(td)
-        backupdb = td / "app.db"
+    rules = backuprules(applist, include, exclude)
+    mediatype, ext = BACKUPFORMATS[format]
+    filename = f"server-ui-backup-{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}.{ext}"
+    return StreamingResponse(
+        streambackup(format, rules, level),
+        media_type=mediatype,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
 
-        src = sqlite3.connect(DBPATH)
-        dst = sqlite3.connect(backupdb)
-        src.backup(dst)
-        dst.close()
-        src.close()
 
-        zippath = td / "backup.zip"
-        with zipfile.ZipFile(zippath, "w", compression=zipfile.ZIP_DEFLATED) as z:
-            z.write(backupdb, arcname="app.db")
-            if APPSDIR.exists():
-                for p in APPSDIR.rglob("*"):
-                    if p.is_file():
-                        rel = p.relative_to(DATADIR)
-                        z.write(p, arcname=str(rel))
-
-        return FileResponse(
-            str(zippath),
-            media_type="application/zip",
-            filename=f"server-ui-backup-{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}.zip",
-        )
+@app.get("/api/system/backups")
+async def api_backups(request: Request):
+    guard = require_auth_api(request)
+    if guard:
+        return guard
+    return {"ok": True, "backups": await runio(listbackups)}
+
+
+@app.post("/api/system/backups")
+async def api_backup_create(request: Request):
+    guard = require_auth_api(request)
+    if guard:
+        return guard
+    return {"ok": True, "jobid": await submitjob("backup", BACKUPAPPID, "create")}
+
+
+@app.post("/api/system/backups/{backupid}/{op}")
+async def api_backup_op(request: Request, backupid: str, op: str):
+    guard = require_auth_api(request)
+    if guard:
+        return guard
+    if op not in ("verify", "restore", "delete"):
+        return JSONResponse({"ok": False, "error": "bad_action"}, status_code=400)
+    if not re.fullmatch(r"[\w-]+", backupid) or not _manifestpath(backupid).exists():
+        return JSONResponse({"ok": False, "error": "not_found"}, status_code=404)
+    return {"ok": True, "jobid": await submitjob("backup", BACKUPAPPID, f"{op}:{backupid}")}
 
 
 @app.get("/api/system/update/check")
@@ -1273,7 +4713,7 @@ async def api_update_check(request: Request):
     guard = require_auth_api(request)
     if guard:
         return guard
-    return updates_check()
+    return await runio(updates_check)
 
 
 @app.post("/api/system/update/apply")
@@ -1281,7 +4721,18 @@ async def api_update_apply(request: Request):
     guard = require_auth_api(request)
     if guard:
         return guard
-    return updates_apply()
+    return await runio(updates_apply)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics(request: Request):
+    # Для Prometheus — Bearer-токен из SERVER_UI_METRICS_TOKEN; из браузера хватает сессии
+    token = request.headers.get("authorization", "")
+    if not (METRICSTOKEN and hmac.compare_digest(token.encode(), f"Bearer {METRICSTOKEN}".encode())):
+        guard = require_auth_api(request)
+        if guard:
+            return guard
+    return PlainTextResponse(rendermetrics(), media_type="text/plain; version=0.0.4")
 
 
 @app.get("/healthz", response_class=PlainTextResponse)
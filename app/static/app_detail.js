@@ -1,14 +1,53 @@
 import { api } from "./api.js";
+import { onEvent, onOpen } from "./events.js";
 const $ = (s, r=document) => r.querySelector(s);
 const $$ = (s, r=document) => Array.from(r.querySelectorAll(s));
 
-const state = { appid: null, logsFollow: true };
+const MAXLOGLINES = 5000;
+
+const state = { appid: null, logsFollow: true, stats: null };
+const logs = { es: null, lines: [], pending: false };
 
 function setTab(tab){
   $$(".tab", $("#appTabs")).forEach(t=>t.classList.toggle("active", t.dataset.tab===tab));
   ["overview","settings","containers","logs"].forEach(x=>{
     $("#appTab-"+x).classList.toggle("hide", x!==tab);
   });
+  if (tab === "logs") { if (!logs.es) openLogStream(); }
+  else closeLogStream();
+}
+
+function logsVisible(){ return !$("#appTab-logs").classList.contains("hide"); }
+
+function fmtBytes(n){
+  if (n == null) return "—";
+  const u = ["B","KB","MB","GB","TB"];
+  let i = 0;
+  while (n >= 1024 && i < u.length-1){ n /= 1024; i++; }
+  return `${n.toFixed(i ? 1 : 0)} ${u[i]}`;
+}
+const fmtRate = (n)=> n == null ? "—" : `${fmtBytes(n)}/с`;
+const fmtCpu = (n)=> n == null ? "—" : `${n.toFixed(1)}%`;
+
+// Ресурсы приложения: сумма по контейнерам + таблица по каждому; обновляется событием containerstats
+function renderStats(){
+  const s = state.stats || {};
+  $("#appStatsKv").innerHTML = `
+    <div class="kvrow"><span class="kvk">CPU</span><span class="kvv mono">${fmtCpu(s.cpu)}</span></div>
+    <div class="kvrow"><span class="kvk">RAM</span><span class="kvv mono">${fmtBytes(s.mem)}</span></div>
+    <div class="kvrow"><span class="kvk">Сеть</span><span class="kvv mono">↓ ${fmtRate(s.net_rx)} ↑ ${fmtRate(s.net_tx)}</span></div>
+    <div class="kvrow"><span class="kvk">Диск</span><span class="kvv mono">R ${fmtRate(s.disk_read)} W ${fmtRate(s.disk_write)}</span></div>
+  `;
+  const conts = s.containers || [];
+  $("#containerStatsTable").innerHTML = conts.length
+    ? conts.map(c=>`<tr>
+        <td class="mono">${c.name}</td>
+        <td class="mono">${fmtCpu(c.cpu)}</td>
+        <td class="mono">${fmtBytes(c.mem)}${c.mem_pct != null ? ` (${c.mem_pct.toFixed(0)}%)` : ""}</td>
+        <td class="mono">↓ ${fmtRate(c.net_rx)} ↑ ${fmtRate(c.net_tx)}</td>
+        <td class="mono">R ${fmtRate(c.disk_read)} W ${fmtRate(c.disk_write)}</td>
+      </tr>`).join("")
+    : `<tr><td class="muted" colspan="5">Нет запущенных контейнеров</td></tr>`;
 }
 
 async function refresh(){
@@ -42,6 +81,9 @@ async function refresh(){
     <div class="kvrow"><span class="kvk">Web UI</span><span class="kvv mono">${app.url || "—"}</span></div>
   `;
 
+  state.stats = app.stats;
+  renderStats();
+
   const env = app.env || {};
   $("#envTable").innerHTML = Object.keys(env).length
     ? Object.entries(env).map(([k,v])=>`<tr><td class="mono">${k}</td><td class="mono">${v}</td></tr>`).join("")
@@ -57,11 +99,17 @@ async function refresh(){
     ? vols.map(v=>`<tr><td class="mono">${v.host}</td><td class="mono">${v.container}</td><td class="mono">${v.mode}</td></tr>`).join("")
     : `<tr><td class="muted" colspan="3">Нет</td></tr>`;
 
+  const pull = app.pull || {};
+  if (document.activeElement !== $("#pullPolicySelect")) $("#pullPolicySelect").value = pull.policy || "stale";
+  if (document.activeElement !== $("#pullMaxAgeInput")) $("#pullMaxAgeInput").value = pull.max_age_hours ?? "";
+  $("#pullMaxAgeInput").disabled = $("#pullPolicySelect").value !== "stale";
+
   const containers = app.containers || [];
   $("#containersList").innerHTML = containers.length
     ? containers.map(c=>`<div class="kvrow"><span class="kvk mono">${c.name}</span><span class="kvv">${c.status}</span></div>`).join("")
     : `<div class="muted">Нет контейнеров</div>`;
 
+  const prev = $("#containerSelect").value;
   $("#containerSelect").innerHTML = "";
   containers.forEach(c=>{
     const opt = document.createElement("option");
@@ -69,22 +117,59 @@ async function refresh(){
     opt.textContent = c.name;
     $("#containerSelect").appendChild(opt);
   });
+  if (containers.some(c=>c.name===prev)) $("#containerSelect").value = prev;
 
-  await refreshLogs();
+  if (logsVisible() && (!logs.es || $("#containerSelect").value !== prev)) openLogStream();
+}
+
+// ---------- logs ----------
+// Основной путь — поток (SSE) только новых строк; опрос целиком — запасной, если поток недоступен.
+function renderLogs(){
+  if (logs.pending) return;
+  logs.pending = true;
+  requestAnimationFrame(()=>{
+    logs.pending = false;
+    $("#containerLogPre").textContent = logs.lines.join("\n");
+    if (state.logsFollow){
+      const box = $("#containerLogPre").parentElement;
+      box.scrollTop = box.scrollHeight;
+    }
+  });
+}
+
+function closeLogStream(){
+  if (logs.es){ logs.es.close(); logs.es = null; }
+}
+
+function openLogStream(){
+  closeLogStream();
+  logs.lines = [];
+  renderLogs();
+  const container = $("#containerSelect").value;
+  if (!container) return;
+  if (!window.EventSource) { refreshLogs(); return; }
+
+  const es = new EventSource(`/api/apps/${encodeURIComponent(state.appid)}/logs/stream?container=${encodeURIComponent(container)}&tail=400`);
+  es.onmessage = (e)=>{
+    let line = null;
+    try { line = JSON.parse(e.data); } catch { return; }
+    logs.lines.push(line);
+    if (logs.lines.length > MAXLOGLINES) logs.lines.splice(0, logs.lines.length - MAXLOGLINES);
+    renderLogs();
+  };
+  es.addEventListener("fail", ()=>{ closeLogStream(); refreshLogs(); });
+  logs.es = es;
 }
 
 async function refreshLogs(){
   const container = $("#containerSelect").value;
-  if (!container) { $("#containerLogPre").textContent = ""; return; }
+  if (!container) { logs.lines = []; renderLogs(); return; }
 
   const {r, data} = await api(`/api/apps/${encodeURIComponent(state.appid)}/logs?container=${encodeURIComponent(container)}&tail=400`);
-  if (!r.ok || !data?.ok) { $("#containerLogPre").textContent = ""; return; }
+  if (!r.ok || !data?.ok) { logs.lines = []; renderLogs(); return; }
 
-  $("#containerLogPre").textContent = data.text || "";
-  if (state.logsFollow){
-    const box = $("#containerLogPre").parentElement;
-    box.scrollTop = box.scrollHeight;
-  }
+  logs.lines = (data.text || "").split("\n");
+  renderLogs();
 }
 
 $("#appTabs").addEventListener("click", (e)=>{
@@ -92,8 +177,19 @@ $("#appTabs").addEventListener("click", (e)=>{
   if (!t) return;
   setTab(t.dataset.tab);
 });
-$("#logsRefreshBtn").addEventListener("click", refreshLogs);
-$("#containerSelect").addEventListener("change", refreshLogs);
+$("#pullPolicySelect").addEventListener("change", ()=>{
+  $("#pullMaxAgeInput").disabled = $("#pullPolicySelect").value !== "stale";
+});
+$("#pullPolicySaveBtn").addEventListener("click", async ()=>{
+  const maxage = $("#pullMaxAgeInput").value;
+  await api(`/api/apps/${encodeURIComponent(state.appid)}/pull-policy`, {method:"POST", json:{
+    policy: $("#pullPolicySelect").value,
+    max_age_hours: maxage === "" ? null : Number(maxage),
+  }});
+  await refresh();
+});
+$("#logsRefreshBtn").addEventListener("click", openLogStream);
+$("#containerSelect").addEventListener("change", openLogStream);
 $("#logsFollowBtn").addEventListener("click", ()=>{
   state.logsFollow = !state.logsFollow;
   $("#logsFollowBtn").textContent = state.logsFollow ? "Автопрокрутка: ВКЛ" : "Автопрокрутка: ВЫКЛ";
@@ -102,4 +198,7 @@ $("#logsFollowBtn").addEventListener("click", ()=>{
 state.appid = $("#appRoot").dataset.appid;
 setTab("overview");
 refresh();
-setInterval(()=>{ if (!$("#appTab-logs").classList.contains("hide")) refreshLogs(); }, 2500);
+onEvent("app", (app)=>{ if (app.id === state.appid) refresh(); });
+onEvent("containerstats", (apps)=>{ state.stats = (apps || {})[state.appid] || null; renderStats(); });
+onOpen(refresh);
+setInterval(()=>{ if (logsVisible() && !logs.es) refreshLogs(); }, 2500);
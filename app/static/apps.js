@@ -1,4 +1,5 @@
 import { api } from "./api.js";
+import { onEvent } from "./events.js";
 const $ = (s, r=document) => r.querySelector(s);
 
 const state = { appsAll: [], appsView: [] };
@@ -126,3 +127,11 @@ $("#installModalWrap").addEventListener("click", (e)=>{ if (e.target === $("#ins
 $("#catalogSearch").addEventListener("input", renderCatalog);
 
 refresh();
+onEvent("app", (app)=>{
+  const i = state.appsAll.findIndex(a=>a.id===app.id);
+  if (i < 0) return;
+  state.appsAll[i] = app;
+  applyAppsFilter();
+  renderInstalled();
+  renderCatalog();
+});
@@ -0,0 +1,64 @@
+import { api } from "./api.js";
+
+// Общий push-канал (SSE) на страницу. Пока он не подключён — модули опрашивают API как раньше.
+const handlers = {};
+const openHandlers = [];
+let es = null;
+let live = false;
+
+function connect(){
+  if (es || !window.EventSource) return;
+  es = new EventSource("/api/events");
+  es.onopen = ()=>{ live = true; openHandlers.forEach(fn=>fn()); };
+  es.onerror = ()=>{ live = false; };
+  Object.keys(handlers).forEach(bind);
+}
+
+function bind(topic){
+  es.addEventListener(topic, (e)=>{
+    let data = null;
+    try { data = JSON.parse(e.data); } catch { return; }
+    (handlers[topic] || []).forEach(fn=>fn(data));
+  });
+}
+
+export function onEvent(topic, fn){
+  const fresh = !handlers[topic];
+  (handlers[topic] ||= []).push(fn);
+  if (es && fresh) bind(topic);
+  connect();
+}
+
+// Вызывается при каждом (пере)подключении — пропущенные события добираем обычным запросом
+export function onOpen(fn){ openHandlers.push(fn); connect(); }
+
+export function isLive(){ return live; }
+
+export function upsertJob(list, job, limit){
+  const i = list.findIndex(j=>j.id===job.id);
+  if (i >= 0) list[i] = job; else list.unshift(job);
+  list.sort((a,b)=>(b.createdat||"").localeCompare(a.createdat||""));
+  if (list.length > limit) list.length = limit;
+  return list;
+}
+
+const sleep = (ms)=>new Promise(res=>setTimeout(res, ms));
+
+// Лента задач без push-канала: long-poll только изменений (since_seq) вместо полного списка раз в 4 с.
+// refresh() грузит список целиком и возвращает его seq; apply(jobs) применяет изменившиеся строки.
+export async function followJobs(refresh, apply){
+  let seq = await refresh();
+  for (;;){
+    if (live || seq == null){
+      await sleep(4000);
+      if (seq == null) seq = await refresh();
+      continue;
+    }
+    let res = null;
+    try { res = await api(`/api/jobs?since_seq=${seq}&wait=25`); } catch {}
+    if (!res?.r.ok || !res.data?.ok){ await sleep(4000); continue; }
+    if (res.data.seq < seq){ seq = await refresh(); continue; }
+    if (res.data.jobs.length) apply(res.data.jobs);
+    seq = res.data.seq;
+  }
+}
@@ -1,4 +1,5 @@
 import { api } from "./api.js";
+import { onEvent, onOpen, isLive, upsertJob, followJobs } from "./events.js";
 const $ = (s, r=document) => r.querySelector(s);
 const $$ = (s, r=document) => Array.from(r.querySelectorAll(s));
 
@@ -12,6 +13,8 @@ const WIDGETCATALOG = [
   {id:"temp", title:"Температура", desc:"Температура CPU", defaultW:2, defaultH:1},
   {id:"uptime", title:"Аптайм", desc:"Время работы", defaultW:2, defaultH:1},
   {id:"net", title:"Сеть", desc:"Трафик", defaultW:4, defaultH:1},
+  {id:"diskio", title:"Диск I/O", desc:"Чтение/запись, IOPS", defaultW:4, defaultH:1},
+  {id:"containers", title:"Контейнеры", desc:"CPU и память приложений", defaultW:4, defaultH:1},
 ];
 
 const state = {
@@ -456,9 +459,10 @@ async function refreshApps(){
 
 async function refreshJobs(){
   const {r, data} = await api("/api/jobs?limit=50");
-  if (!r.ok || !data?.ok) return;
+  if (!r.ok || !data?.ok) return null;
   state.jobs = data.jobs || [];
   renderJobsPreview();
+  return data.seq;
 }
 
 // ---------- modal open/close ----------
@@ -485,8 +489,24 @@ bindCanvasDrop();
 
   await refreshTiles();
   await refreshApps();
-  await refreshJobs();
 
-  setInterval(refreshTiles, 3000);
-  setInterval(refreshJobs, 4000);
+  onEvent("tiles", (tiles)=>{
+    const map = {};
+    (tiles || []).forEach(t => { map[t.id] = t; });
+    state.tilesMap = map;
+    renderHomeTiles();
+  });
+  onEvent("jobs", (jobs)=>{ state.jobs = (jobs || []).slice(0,50); renderJobsPreview(); });
+  onEvent("job", (job)=>{ upsertJob(state.jobs, job, 50); renderJobsPreview(); });
+  onEvent("app", (app)=>{
+    const i = state.appsAll.findIndex(a=>a.id===app.id);
+    if (i >= 0) state.appsAll[i] = app; else state.appsAll.push(app);
+    renderHomeLauncher();
+    $("#installedCountPill").textContent = String(state.appsAll.filter(a=>a.installed).length);
+  });
+  onOpen(refreshApps);
+
+  // Опрос — только запасной путь, пока push-канал недоступен
+  setInterval(()=>{ if (!isLive()) refreshTiles(); }, 3000);
+  followJobs(refreshJobs, (jobs)=>{ jobs.forEach(j=>upsertJob(state.jobs, j, 50)); renderJobsPreview(); });
 })();
@@ -1,26 +1,85 @@
 import { api } from "./api.js";
+import { onEvent, upsertJob, followJobs } from "./events.js";
 const $ = (s, r=document) => r.querySelector(s);
 
+function fmtBytes(n){
+  const u = ["B","KB","MB","GB","TB"];
+  let i = 0;
+  while (n >= 1024 && i < u.length-1){ n /= 1024; i++; }
+  return `${n.toFixed(i ? 1 : 0)} ${u[i]}`;
+}
+
+function progressText(j){
+  const p = j.progress;
+  if (!p || j.status !== "running") return "";
+  if (p.phase !== "pull") return `${p.phase} ${p.pct}% • ${fmtBytes(p.current)} / ${fmtBytes(p.total)}`;
+  const eta = (p.eta != null) ? ` • ~${Math.floor(p.eta/60)}:${String(p.eta%60).padStart(2,"0")}` : "";
+  return `pull ${p.pct}% • ${fmtBytes(p.current)} / ${fmtBytes(p.total)} • ${fmtBytes(p.rate)}/с${eta}`;
+}
+
 function jobRow(j){
   const cls = (j.status==="success") ? "ok" : ((j.status==="running"||j.status==="queued") ? "warn" : "bad");
   const act = j.action || j.kind;
+  const cancel = (j.status==="queued") ? `<button class="btn" data-cancel="${j.id}" type="button">Отменить</button>` : "";
   return `
     <div class="kvrow">
       <span class="kvk mono">${j.appid}</span>
       <span class="kvv" style="display:inline-flex; gap:10px; align-items:center; flex-wrap:wrap">
         <span class="pill ${cls}">${act}</span>
-        <span class="muted">${j.message || ""}</span>
+        <span class="muted">${progressText(j) || j.message || (j.status==="queued" ? "в очереди" : "")}</span>
+        ${cancel}
       </span>
     </div>
   `;
 }
 
+const PAGE = 80;
+const state = { jobs: [], cursor: null, paged: false };
+
+function render(){
+  $("#jobsFull").innerHTML = state.jobs.map(jobRow).join("") || `<div class="muted">Нет задач.</div>`;
+  if ($("#jobsCountPill")) $("#jobsCountPill").textContent = String(state.jobs.length);
+  $("#jobsMoreBtn").classList.toggle("hide", !state.cursor);
+}
+
+// Свежая первая страница заменяет начало списка; подгруженные старые страницы сохраняем
+function mergeHead(jobs){
+  const ids = new Set(jobs.map(j=>j.id));
+  const last = jobs.length ? jobs[jobs.length-1].createdat || "" : "";
+  state.jobs = jobs.concat(state.paged ? state.jobs.filter(j=>!ids.has(j.id) && (j.createdat||"") < last) : []);
+}
+
 async function refresh(){
-  const {r, data} = await api("/api/jobs?limit=80");
+  const {r, data} = await api(`/api/jobs?limit=${PAGE}`);
+  if (!r.ok || !data?.ok) return null;
+  mergeHead(data.jobs || []);
+  if (!state.paged) state.cursor = data.next_cursor;
+  render();
+  return data.seq;
+}
+
+function upsert(job){ upsertJob(state.jobs, job, state.paged ? state.jobs.length + 1 : PAGE); }
+
+async function loadMore(){
+  if (!state.cursor) return;
+  const {r, data} = await api(`/api/jobs?limit=${PAGE}&before=${encodeURIComponent(state.cursor)}`);
   if (!r.ok || !data?.ok) return;
-  $("#jobsFull").innerHTML = (data.jobs || []).map(jobRow).join("") || `<div class="muted">Нет задач.</div>`;
-  if ($("#jobsCountPill")) $("#jobsCountPill").textContent = String((data.jobs || []).length);
+  const ids = new Set(state.jobs.map(j=>j.id));
+  state.jobs = state.jobs.concat((data.jobs || []).filter(j=>!ids.has(j.id)));
+  state.cursor = data.next_cursor;
+  state.paged = true;
+  render();
 }
 
-refresh();
-setInterval(refresh, 4000);
+$("#jobsFull").addEventListener("click", async (e)=>{
+  const b = e.target.closest("button[data-cancel]");
+  if (!b) return;
+  b.disabled = true;
+  await api(`/api/jobs/${encodeURIComponent(b.dataset.cancel)}/cancel`, {method:"POST"});
+});
+
+$("#jobsMoreBtn").addEventListener("click", loadMore);
+
+onEvent("jobs", (jobs)=>{ mergeHead(jobs || []); render(); });
+onEvent("job", (job)=>{ upsert(job); render(); });
+followJobs(refresh, (jobs)=>{ jobs.forEach(upsert); render(); });
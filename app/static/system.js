@@ -1,4 +1,5 @@
 import { api } from "./api.js";
+import { onEvent } from "./events.js";
 const $ = (s, r=document) => r.querySelector(s);
 
 function setUpdStatus(html){ $("#updStatus").innerHTML = html; }
@@ -29,6 +30,50 @@ async function refreshSystemInfo(){
 
 $("#backupBtn").addEventListener("click", ()=>{ location.href="/api/system/backup"; });
 
+// ---------- incremental backups ----------
+function fmtBytes(n){
+  const u = ["B","KB","MB","GB","TB"];
+  let i = 0;
+  while (n >= 1024 && i < u.length-1){ n /= 1024; i++; }
+  return `${n.toFixed(i ? 1 : 0)} ${u[i]}`;
+}
+
+async function refreshBackups(){
+  const {r, data} = await api("/api/system/backups");
+  if (!r.ok || !data?.ok) return;
+  const list = data.backups || [];
+  $("#backupsList").innerHTML = list.length ? list.map(b=>`
+    <div class="kvrow">
+      <span class="kvk mono">${b.id}</span>
+      <span class="kvv" style="display:inline-flex; gap:10px; align-items:center; flex-wrap:wrap">
+        <span class="muted">${b.files} файлов • ${fmtBytes(b.bytes)} • новых ${fmtBytes(b.newbytes)} • ${b.seconds} с</span>
+        <button class="btn" data-op="verify" data-id="${b.id}" type="button">Проверить</button>
+        <button class="btn" data-op="restore" data-id="${b.id}" type="button">Восстановить</button>
+        <button class="btn danger" data-op="delete" data-id="${b.id}" type="button">Удалить</button>
+      </span>
+    </div>`).join("") : `<div class="muted">Бэкапов нет.</div>`;
+}
+
+async function backupOp(url){
+  const {r, data} = await api(url, {method:"POST"});
+  $("#backupJobMsg").textContent = (r.ok && data?.ok) ? "Задача поставлена в очередь" : "Ошибка";
+}
+
+$("#backupCreateBtn").addEventListener("click", ()=>backupOp("/api/system/backups"));
+$("#backupsList").addEventListener("click", (e)=>{
+  const b = e.target.closest("button[data-op]");
+  if (!b) return;
+  if (b.dataset.op === "delete" && !confirm(`Удалить бэкап ${b.dataset.id}?`)) return;
+  backupOp(`/api/system/backups/${encodeURIComponent(b.dataset.id)}/${b.dataset.op}`);
+});
+
+onEvent("job", (job)=>{
+  if (job.kind !== "backup") return;
+  const p = job.progress;
+  $("#backupJobMsg").textContent = (job.status === "running" && p) ? `${p.phase} ${p.pct}%` : (job.message || job.status);
+  if (job.status !== "running" && job.status !== "queued") refreshBackups();
+});
+
 $("#savePassBtn").addEventListener("click", async ()=>{
   const current_password = String($("#curPass").value || "");
   const new_password = String($("#newPass").value || "");
@@ -91,3 +136,4 @@ $("#doUpdBtn").addEventListener("click", async ()=>{
 });
 
 refreshSystemInfo();
+refreshBackups();
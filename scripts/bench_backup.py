@@ -0,0 +1,112 @@
+"""Замер потоковых бэкапов: прежний zipfile против _ParallelZip и tar.gz на пуле потоков.
+
+    python scripts/bench_backup.py [--text-mb 64] [--media-mb 110] [--formats old-zip,zip,tar.gz,tar.gz:1]
+
+Набор данных: текст из случайных слов (файлы по 8 МБ) плюс случайные .mkv/.jpg, которые не сжимаются.
+Архив пишется в пустой приёмник — меряется сборка и сжатие, а не диск. Пропускная способность —
+мегабайты входа в секунду. Масштабирование по ядрам зависит от CPUWORKERS (SERVER_UI_CPU_WORKERS).
+"""
+import argparse
+import shutil
+import os
+import random
+import sys
+import tempfile
+import time
+import zipfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "app"))
+import main  # noqa: E402
+
+MB = 1024 * 1024
+APPID = "bench"
+
+
+class NullSink:
+    """Неперематываемый приёмник, как _ChunkWriter: только write/flush."""
+
+    def __init__(self):
+        self.size = 0
+
+    def write(self, data) -> int:
+        self.size += len(data)
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+
+def makedata(root: Path, textmb: int, mediamb: int) -> int:
+    rnd = random.Random(1)
+    words = ["".join(rnd.choices("abcdefghijklmnopqrstuvwxyz", k=rnd.randint(2, 10))) for _ in range(5000)]
+    total = 0
+    (root / "text").mkdir(parents=True, exist_ok=True)
+    for i in range(max(1, textmb // 8)):
+        data = bytearray()
+        while len(data) < 8 * MB:
+            data += (" ".join(rnd.choices(words, k=20000)) + "\n").encode("ascii")
+        (root / "text" / f"part{i}.log").write_bytes(data[: 8 * MB])
+        total += 8 * MB
+    (root / "media").mkdir(parents=True, exist_ok=True)
+    left, n = mediamb * MB, 0
+    while left > 0:
+        size = min(left, 20 * MB if n % 2 == 0 else 2 * MB)
+        ext = ".mkv" if n % 2 == 0 else ".jpg"
+        (root / "media" / f"file{n}{ext}").write_bytes(os.urandom(size))
+        left -= size
+        total += size
+        n += 1
+    return total
+
+
+def oldzip(out, rules: dict) -> None:
+    # zip до _ParallelZip: zipfile, всё через deflate в одном потоке, включая медиа
+    dbpath = main._dbsnapshot()
+    try:
+        with zipfile.ZipFile(out, "w", compression=zipfile.ZIP_DEFLATED) as z:
+            z.write(dbpath, arcname="app.db")
+            for path, arcname in main.backupfiles(rules):
+                z.write(path, arcname=arcname)
+    finally:
+        os.unlink(dbpath)
+
+
+def run() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--text-mb", type=int, default=64)
+    ap.add_argument("--media-mb", type=int, default=110)
+    ap.add_argument("--formats", default="old-zip,zip,tar.gz,tar.gz:1")
+    args = ap.parse_args()
+
+    tmp = Path(tempfile.mkdtemp(prefix="bench-backup-"))
+    try:
+        measure(tmp, args)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def measure(tmp: Path, args) -> None:
+    main.DATADIR = tmp
+    main.DBPATH = tmp / "app.db"
+    main.APPSDIR = tmp / "apps"
+    main.initdb()
+    total = makedata(main.appdir(APPID), args.text_mb, args.media_mb)
+    rules = {APPID: []}
+    print(f"input {total / MB:.0f} MB ({args.text_mb} MB text, {args.media_mb} MB media), cpu workers {main.CPUWORKERS}")
+
+    for spec in args.formats.split(","):
+        fmt, _, level = spec.partition(":")
+        level = int(level) if level else main.BACKUPLEVEL
+        sink = NullSink()
+        t = time.perf_counter()
+        if fmt == "old-zip":
+            oldzip(sink, rules)
+        else:
+            main.writebackup(sink, fmt, rules, level)
+        dt = time.perf_counter() - t
+        print(f"  {spec:12} {total / MB / dt:7.1f} MB/s {dt:6.1f} s  -> {sink.size / MB:.0f} MB")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,92 @@
+"""Замер db(): соединение на поток (WAL, кэш выражений) против нового sqlite3.connect на каждый вызов.
+
+    python scripts/bench_db.py [--requests 1000] [--jobs 30]
+
+Старый db() подставляется вместо текущего в том же процессе, остальной код одинаковый. Режим WAL
+хранится в самом файле базы, поэтому старый вариант тоже работает с WAL — разница только в открытии
+соединения, mkdir и подготовке выражений.
+"""
+import argparse
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "app"))
+import main  # noqa: E402
+
+
+def legacydb() -> sqlite3.Connection:
+    # db() до кэша соединений
+    main.DATADIR.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(main.DBPATH)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def rate(client: TestClient, url: str, n: int) -> float:
+    client.get(url)
+    t = time.perf_counter()
+    for _ in range(n):
+        r = client.get(url)
+        assert r.status_code == 200, (url, r.status_code)
+    return n / (time.perf_counter() - t)
+
+
+def selectcost(dbfn, n: int) -> float:
+    t = time.perf_counter()
+    for _ in range(n):
+        with dbfn() as conn:
+            conn.execute("SELECT value FROM counters WHERE name='jobs'").fetchone()
+    return (time.perf_counter() - t) / n
+
+
+def run() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--requests", type=int, default=1000)
+    ap.add_argument("--jobs", type=int, default=30)
+    args = ap.parse_args()
+
+    tmp = Path(tempfile.mkdtemp(prefix="bench-db-"))
+    try:
+        measure(tmp, args)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def measure(tmp: Path, args) -> None:
+    main.DATADIR = tmp
+    main.DBPATH = tmp / "app.db"
+    main.APPSDIR = tmp / "apps"
+    main.initdb()
+    for i in range(args.jobs):
+        main.createjob("action", "bench", "restart")
+
+    # Без lifespan: сэмплеры и docker не запускаются, меряется только обработчик
+    client = TestClient(main.app)
+    r = client.post("/api/setup", json={"login": "admin", "password": "secret1"})
+    assert r.status_code == 200, r.text
+
+    current = main.db
+    results = {}
+    for label, dbfn in (("per-call connect", legacydb), ("per-thread db()", current)):
+        main.db = dbfn
+        results[label] = (
+            rate(client, "/api/jobs", args.requests),
+            rate(client, "/home", args.requests),
+            selectcost(dbfn, args.requests * 5),
+        )
+    main.db = current
+
+    print(f"{args.requests} requests, {args.jobs} jobs in the table")
+    print(f"  {'':18} {'/api/jobs':>12} {'/home':>12} {'SELECT':>10}")
+    for label, (jobs, home, sel) in results.items():
+        print(f"  {label:18} {jobs:8.0f} r/s {home:8.0f} r/s {sel * 1e6:7.1f} us")
+
+
+if __name__ == "__main__":
+    run()
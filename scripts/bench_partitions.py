@@ -0,0 +1,83 @@
+"""Замер list_disk_partitions: кэш по POLLPRI на /proc/self/mounts против psutil.disk_partitions на каждый вызов.
+
+    python scripts/bench_partitions.py [--calls 2000] [--mounts 250]
+
+--mounts N (только root, Linux) добавляет N tmpfs-точек во временный каталог — как таблица монтирования
+docker-хоста с сотнями overlay-строк; после замера они снимаются.
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import psutil
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "app"))
+import main  # noqa: E402
+
+
+def uncached() -> list[tuple[str, str]]:
+    # Как было до кэша: разбор всей таблицы и фильтр на каждый вызов
+    return [(p.device, p.mountpoint) for p in psutil.disk_partitions(all=False) if p.fstype not in main.SKIPFSTYPES]
+
+
+def percall(fn, calls: int) -> float:
+    fn()
+    t = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - t) / calls
+
+
+def mount(target: str) -> None:
+    os.makedirs(target, exist_ok=True)
+    subprocess.run(["mount", "-t", "tmpfs", "-o", "size=1m", "tmpfs", target], check=True)
+
+
+def run() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--calls", type=int, default=2000)
+    ap.add_argument("--mounts", type=int, default=0)
+    args = ap.parse_args()
+
+    base = tempfile.mkdtemp(prefix="bench-mounts-")
+    mounted: list[str] = []
+    try:
+        for i in range(args.mounts):
+            mount(os.path.join(base, str(i)))
+            mounted.append(os.path.join(base, str(i)))
+        with open(main.MOUNTSFILE) as f:
+            rows = sum(1 for _ in f)
+        print(f"mount table: {rows} lines, {args.calls} calls")
+        print(f"  psutil.disk_partitions + filter: {percall(uncached, args.calls) * 1e6:8.1f} us/call")
+        print(f"  cached list_disk_partitions:     {percall(main.list_disk_partitions, args.calls) * 1e6:8.1f} us/call")
+
+        if args.mounts:
+            # Новое монтирование должно сбросить кэш на следующем вызове
+            reads = 0
+            orig = psutil.disk_partitions
+
+            def counting(*a, **kw):
+                nonlocal reads
+                reads += 1
+                return orig(*a, **kw)
+
+            psutil.disk_partitions = counting
+            main.list_disk_partitions()
+            mount(os.path.join(base, "extra"))
+            mounted.append(os.path.join(base, "extra"))
+            main.list_disk_partitions()
+            psutil.disk_partitions = orig
+            print(f"  re-read after mount: {'yes' if reads == 1 else 'NO'}")
+    finally:
+        for target in reversed(mounted):
+            subprocess.run(["umount", target], check=False)
+        shutil.rmtree(base, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    run()
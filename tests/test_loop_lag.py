@@ -0,0 +1,75 @@
+"""Обработчики не должны держать event loop: пока идут логины (bcrypt), проверка обновлений (git)
+и опрос задач, asyncio.sleep просыпается почти вовремя."""
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "app"))
+import main  # noqa: E402
+
+LAGLIMIT = 0.25
+
+
+def _slowgit(args, cwd):
+    # git fetch по медленной сети
+    time.sleep(0.5)
+    return True, "0"
+
+
+async def _scenario() -> list[float]:
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as c:
+        r = await c.post("/api/setup", json={"login": "admin", "password": "secret1"})
+        assert r.status_code == 200, r.text
+
+        lags: list[float] = []
+        done = asyncio.Event()
+
+        async def probe():
+            while not done.is_set():
+                t = time.perf_counter()
+                await asyncio.sleep(0.01)
+                lags.append(time.perf_counter() - t - 0.01)
+
+        async def login():
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as c2:
+                for _ in range(2):
+                    r = await c2.post("/api/login", json={"login": "admin", "password": "secret1"})
+                    assert r.status_code == 200
+
+        async def update():
+            for _ in range(2):
+                r = await c.get("/api/system/update/check")
+                assert r.json()["status"] == "ok"
+
+        async def jobs():
+            for _ in range(20):
+                r = await c.get("/api/jobs?limit=80")
+                assert r.json()["ok"]
+
+        prober = asyncio.create_task(probe())
+        await asyncio.gather(*[login() for _ in range(3)], update(), update(), jobs(), jobs())
+        done.set()
+        await prober
+        return lags
+
+
+def test_loop_lag_under_concurrent_handlers(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "DATADIR", tmp_path)
+    monkeypatch.setattr(main, "DBPATH", tmp_path / "app.db")
+    monkeypatch.setattr(main, "APPSDIR", tmp_path / "apps")
+    monkeypatch.setattr(main, "ICONSDIR", tmp_path / "icons")
+    monkeypatch.setattr(main, "LOGSDIR", tmp_path / "logs")
+    monkeypatch.setattr(main, "BACKUPSDIR", tmp_path / "backups")
+    repo = tmp_path / "repo"
+    (repo / ".git").mkdir(parents=True)
+    monkeypatch.setattr(main, "APPDIR", repo)
+    monkeypatch.setattr(main, "_run_git", _slowgit)
+    main.initdb()
+
+    lags = sorted(asyncio.run(_scenario()))
+    assert lags, "probe did not run"
+    assert lags[-1] < LAGLIMIT, f"max loop lag {lags[-1] * 1000:.0f} ms, p50 {lags[len(lags) // 2] * 1000:.1f} ms"